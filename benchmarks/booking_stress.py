@@ -0,0 +1,91 @@
+"""Stress test for concurrent booking.
+
+Starts a number of threads that all try to book seats for the same small
+showing until it sells out, then checks that no tier was oversold and that
+the seat counters on the showing match its bookings.
+
+Run from the root of the repo with:
+    python -m benchmarks.booking_stress --threads 16 --database sqlite:///stress.db
+"""
+import argparse
+import random
+import threading
+import time
+
+from sqlalchemy import func
+
+from benchmarks.seed import setup_database, seed_database
+from database_models import session_factory, Booking, Showing
+from services import book_seats, SoldOutError
+
+
+def clerk(showing_id, employee_id, results, lock):
+    """Keeps making small bookings until every tier has sold out."""
+    booked = sold_out = 0
+    tiers_left = {0, 1, 2}
+
+    while tiers_left:
+        seats = [0, 0, 0]
+        seats[random.choice(list(tiers_left))] = random.randint(1, 4)
+        try:
+            book_seats(showing_id, employee_id, *seats, name="Stress", phone="0", email="stress@example.com")
+            booked += 1
+        except SoldOutError:
+            sold_out += 1
+            if sold_out > 50:
+                break  # Remaining seats are fewer than any request we keep making
+
+    with lock:
+        results["booked"] += booked
+        results["sold_out"] += sold_out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default="sqlite:///booking_stress.db", help="database uri to stress, it will be emptied first")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--capacity", type=int, nargs=3, default=(300, 600, 60), metavar=("LOWER", "UPPER", "VIP"))
+    args = parser.parse_args()
+
+    setup_database(args.database)
+
+    session = session_factory()
+    (showing_id,), (employee_id,) = seed_database(session, capacity=args.capacity)
+    session.close()
+
+    results = {"booked": 0, "sold_out": 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=clerk, args=(showing_id, employee_id, results, lock))
+        for _ in range(args.threads)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    session = session_factory()
+    showing = session.get(Showing, showing_id)
+    booked = session.query(
+        func.sum(Booking.lower_booked), func.sum(Booking.upper_booked), func.sum(Booking.vip_booked)
+    ).filter(Booking.showing_id == showing_id).one()
+    counters = (showing.lower_sold, showing.upper_sold, showing.vip_sold)
+    capacity = (showing.screen.lower_capacity, showing.screen.upper_capacity, showing.screen.vip_capacity)
+    session.close()
+
+    oversold = sum(max(0, sold - cap) for sold, cap in zip(booked, capacity))
+
+    print(f"Bookings made:    {results['booked']} ({results['booked'] / elapsed:.1f} per second over {elapsed:.2f}s)")
+    print(f"Sold out refusals: {results['sold_out']}")
+    print(f"Seats booked:     {booked} of {capacity}")
+    print(f"Seat counters:    {counters}")
+    print(f"Oversold seats:   {oversold}")
+
+    if oversold or tuple(booked) != counters:
+        raise SystemExit("FAILED: seats were oversold or counters drifted from bookings")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""Load generator simulating many box office terminals booking at once.
+
+Seeds a scratch database through the models in database_models, then runs one
+thread per clerk doing a mix of quotes, bookings and cancellations through the
+services package for a fixed amount of time. Throughput, latency percentiles,
+lock waits (transactions retried after a lock timeout, deadlock or serialization
+failure) and oversold seats are written as JSON so runs can be compared between
+commits.
+
+Run from the root of the repo with:
+    python -m benchmarks.load_generator --clerks 50 --duration 30 \\
+        --database sqlite:///load.db --database postgresql://localhost/cinema_load \\
+        --output load_results.json
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import func
+
+from benchmarks.seed import setup_database, seed_database
+from database_models import session_factory, Booking, Screen, Showing
+from services import book_seats, quote_booking, cancel_booking, SoldOutError
+
+OPERATIONS = ("quote", "book", "cancel")
+
+
+def percentile_ms(sorted_latencies, fraction):
+    """Nearest-rank percentile of an already sorted list of latencies, in milliseconds."""
+    if not sorted_latencies:
+        return None
+
+    index = min(len(sorted_latencies) - 1, max(0, round(fraction * len(sorted_latencies)) - 1))
+    return sorted_latencies[index] * 1000
+
+
+class Clerk(threading.Thread):
+    """A single terminal, picking operations at random by weight until told to stop."""
+    def __init__(self, showing_ids, employee_id, weights, stop_event):
+        super().__init__()
+        self.showing_ids = showing_ids
+        self.employee_id = employee_id
+        self.weights = weights
+        self.stop_event = stop_event
+
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.sold_out = 0
+        self.lock_waits = 0
+        self.booking_ids = []
+
+    def lock_wait(self, error):
+        self.lock_waits += 1
+
+    def run(self):
+        while not self.stop_event.is_set():
+            operation = random.choices(OPERATIONS, weights=self.weights)[0]
+            if operation == "cancel" and not self.booking_ids:
+                operation = "book"
+
+            seats = [random.randint(0, 3) for _ in range(3)]
+            if not any(seats):
+                seats[0] = 1
+
+            start = time.perf_counter()
+            try:
+                if operation == "quote":
+                    quote_booking(random.choice(self.showing_ids), *seats)
+                elif operation == "book":
+                    booking = book_seats(
+                        random.choice(self.showing_ids), self.employee_id, *seats,
+                        name="Load", phone="0", email="load@example.com", on_retry=self.lock_wait)
+                    self.booking_ids.append(booking.id)
+                else:
+                    cancel_booking(self.booking_ids.pop(random.randrange(len(self.booking_ids))))
+            except SoldOutError:
+                self.sold_out += 1
+            except Exception as e:
+                self.errors[f"{operation}: {type(e).__name__}"] += 1
+                continue
+
+            self.latencies[operation].append(time.perf_counter() - start)
+
+
+def check_oversold():
+    """Counts seats sold beyond capacity, and showings whose seat counters
+    don't match their bookings."""
+    session = session_factory()
+    try:
+        booked = session.query(
+            Booking.showing_id,
+            func.sum(Booking.lower_booked),
+            func.sum(Booking.upper_booked),
+            func.sum(Booking.vip_booked)
+        ).group_by(Booking.showing_id)
+        booked = {showing_id: seats for showing_id, *seats in booked}
+
+        oversold = drifted = 0
+        query = session.query(
+            Showing.id, Showing.lower_sold, Showing.upper_sold, Showing.vip_sold,
+            Screen.lower_capacity, Screen.upper_capacity, Screen.vip_capacity).join(Showing.screen)
+        for showing_id, *values in query:
+            counters, capacity = values[:3], values[3:]
+            seats = booked.get(showing_id, [0, 0, 0])
+
+            oversold += sum(max(0, sold - cap) for sold, cap in zip(seats, capacity))
+            drifted += list(seats) != list(counters)
+
+        return oversold, drifted
+    finally:
+        session.close()
+
+
+def run_load(uri, clerks, duration, weights, cinemas, screens_per_cinema, films, showings_per_screen, capacity):
+    """Runs one load test against the database at uri and returns its results."""
+    setup_database(uri)
+
+    session = session_factory()
+    showing_ids, employee_ids = seed_database(
+        session, cinemas=cinemas, screens_per_cinema=screens_per_cinema, films=films,
+        showings_per_screen=showings_per_screen, employees=clerks, capacity=capacity)
+    session.close()
+
+    stop_event = threading.Event()
+    threads = [Clerk(showing_ids, employee_id, weights, stop_event) for employee_id in employee_ids]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    operations = {}
+    for operation in OPERATIONS:
+        latencies = sorted(latency for thread in threads for latency in thread.latencies[operation])
+        operations[operation] = {
+            "count": len(latencies),
+            "per_second": len(latencies) / elapsed,
+            "p50_ms": percentile_ms(latencies, 0.50),
+            "p95_ms": percentile_ms(latencies, 0.95),
+            "p99_ms": percentile_ms(latencies, 0.99),
+        }
+
+    errors = defaultdict(int)
+    for thread in threads:
+        for error, count in thread.errors.items():
+            errors[error] += count
+
+    oversold, drifted = check_oversold()
+
+    return {
+        "database": session_factory.kw["bind"].dialect.name,
+        "elapsed_s": elapsed,
+        "throughput_per_second": sum(op["count"] for op in operations.values()) / elapsed,
+        "operations": operations,
+        "sold_out": sum(thread.sold_out for thread in threads),
+        "lock_waits": sum(thread.lock_waits for thread in threads),
+        "errors": dict(errors),
+        "oversold_seats": oversold,
+        "showings_with_drifted_counters": drifted,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--database", action="append",
+        help="database uri to load test, it will be emptied first. Can be given more than once "
+             "(default: sqlite:///load_generator.db)")
+    parser.add_argument("--clerks", type=int, default=50, help="number of concurrent terminals")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run each load test for")
+    parser.add_argument(
+        "--mix", type=float, nargs=3, default=(70, 25, 5), metavar=("QUOTE", "BOOK", "CANCEL"),
+        help="relative weights of each operation")
+    parser.add_argument("--cinemas", type=int, default=7)
+    parser.add_argument("--screens", type=int, default=4, help="screens per cinema")
+    parser.add_argument("--films", type=int, default=20)
+    parser.add_argument("--showings", type=int, default=6, help="showings per screen")
+    parser.add_argument("--capacity", type=int, nargs=3, default=(60, 130, 10), metavar=("LOWER", "UPPER", "VIP"))
+    parser.add_argument("--output", help="file to write the JSON results to (default: stdout)")
+    args = parser.parse_args()
+
+    results = {
+        "commit": git_commit(),
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "parameters": {
+            "clerks": args.clerks,
+            "duration_s": args.duration,
+            "mix": dict(zip(OPERATIONS, args.mix)),
+            "cinemas": args.cinemas,
+            "screens_per_cinema": args.screens,
+            "films": args.films,
+            "showings_per_screen": args.showings,
+            "capacity": args.capacity,
+        },
+        "runs": {},
+    }
+
+    for uri in args.database or ["sqlite:///load_generator.db"]:
+        results["runs"][uri] = run_load(
+            uri, args.clerks, args.duration, args.mix, args.cinemas, args.screens,
+            args.films, args.showings, args.capacity)
+
+    output = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
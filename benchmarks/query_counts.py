@@ -0,0 +1,72 @@
+"""Checks that the hot paths run a fixed number of queries however much data there is.
+
+Each check is run against a small and a large seeded database. The check fails if
+it ran more statements than its budget on either, which is what happens when a
+relationship starts being lazy loaded once per row again.
+
+Run from the root of the repo with:
+    python -m benchmarks.query_counts
+"""
+from datetime import datetime
+
+from sqlalchemy import event
+
+from benchmarks.seed import setup_database, seed_database
+from database_models import session_factory
+from services import list_showings, list_films_showing
+
+# name: (function to run, maximum number of statements it may execute)
+CHECKS = {
+    "list_showings, all cinemas and films": (lambda: list_showings(), 1),
+    "list_films_showing, first page today": (lambda: list_films_showing(1, datetime.now().date()), 3),
+    "list_films_showing, last page today": (lambda: list_films_showing(1, datetime.now().date(), page=1000), 3),
+}
+
+DATABASE_SIZES = {
+    "small": {"cinemas": 1, "screens_per_cinema": 1, "films": 1, "showings_per_screen": 1},
+    "large": {"cinemas": 7, "screens_per_cinema": 6, "films": 40, "showings_per_screen": 8},
+}
+
+
+class QueryCounter:
+    """Counts the statements executed on an engine while in a with block."""
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self.before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self.before_cursor_execute)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def main():
+    failures = []
+
+    for size, seed_kwargs in DATABASE_SIZES.items():
+        engine = setup_database("sqlite://")
+
+        session = session_factory()
+        seed_database(session, **seed_kwargs)
+        session.close()
+
+        for name, (check, budget) in CHECKS.items():
+            with QueryCounter(engine) as counter:
+                check()
+
+            status = "ok" if counter.count <= budget else "FAILED"
+            print(f"{status:6} {name} ({size} database): {counter.count} queries, budget {budget}")
+            if counter.count > budget:
+                failures.append(name)
+
+    if failures:
+        raise SystemExit(f"{len(failures)} checks went over their query budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Checks that the hot queries in the windows and reports use the indexes declared on the models.
+
+Each check runs a service function against a seeded sqlite database, capturing
+every SELECT it executes, then asks sqlite for the plan of each one with
+EXPLAIN QUERY PLAN. The check fails if any of the indexes it expects are missing
+from the plans, which is what happens when an index is dropped or a query stops
+filtering on the columns the index starts with.
+
+The statements that price bookings in the database are also compiled for
+postgresql, which fails if any of them round a float to decimal places, as
+postgresql only has round(double precision) and round(numeric, integer).
+
+Run from the root of the repo with:
+    python -m benchmarks.query_plans [--verbose]
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql
+
+from benchmarks.seed import setup_database, seed_database
+from database_models import session_factory, rebuild_daily_revenue, Cinema, Film, Screen
+from database_models.booking import booking_price
+from services import list_showings, run_report, ScreenSchedule
+from services.showings import find_conflicting_showing, get_show_times
+
+
+def conflict_check(ids):
+    session = session_factory()
+    try:
+        show_times = get_show_times(timedelta(minutes=90), ids["day_start"] + timedelta(hours=12))
+        find_conflicting_showing(session, ids["screen_id"], show_times)
+    finally:
+        session.close()
+
+
+def schedule_check(ids):
+    session = session_factory()
+    try:
+        ScreenSchedule.load_many(session, [ids["screen_id"]], ids["day_start"], ids["day_start"] + timedelta(days=1))
+    finally:
+        session.close()
+
+
+# name: (function to run with the seeded ids, indexes its queries must use)
+CHECKS = {
+    "showings window, filtered by film": (
+        lambda ids: list_showings(film_id=ids["film_id"]),
+        {"ix_showing_film_id_show_time"}),
+    "showings window, filtered by cinema and date": (
+        lambda ids: list_showings(cinema_id=ids["cinema_id"], date=ids["day_start"].date()),
+        {"ix_screen_cinema_id", "ix_showing_screen_id_show_time"}),
+    "showing clash check": (
+        conflict_check,
+        {"ix_showing_screen_id_show_time"}),
+    "screen schedules for recurring showings": (
+        schedule_check,
+        {"ix_showing_screen_id_show_time"}),
+    "monthly revenue report": (
+        lambda ids: run_report("MONTHLY_REVENUE", ids["day_start"].month, ids["day_start"].year),
+        {"ix_daily_revenue_key"}),
+    "employee bookings report": (
+        lambda ids: run_report("EMPLOYEE_BOOKINGS", ids["day_start"].month, ids["day_start"].year),
+        {"ix_daily_revenue_key"}),
+    "top revenue report for a month": (
+        lambda ids: run_report(
+            "TOP_REVENUE", top_n=5, date_from=ids["day_start"].date().replace(day=1), date_to=ids["day_start"].date()),
+        {"ix_daily_revenue_key"}),
+}
+
+
+class CompilingConnection:
+    """Stands in for a connection, recording the statements executed on it rather than running them."""
+    rowcount = 0
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement):
+        self.statements.append(statement)
+        return self
+
+
+def rebuild_statements(ids):
+    connection = CompilingConnection()
+    rebuild_daily_revenue(connection, ids["day_start"].date(), ids["day_start"].date())
+    return connection.statements
+
+
+# name: function returning the statements, run with the seeded ids
+POSTGRESQL_CHECKS = {
+    "booking price": lambda ids: [select(booking_price())],
+    "daily revenue rebuild": rebuild_statements,
+}
+
+
+def float_rounding(sql):
+    """Returns the calls in sql that round to decimal places without casting to NUMERIC first."""
+    problems = []
+    start = sql.find("round(")
+    while start != -1:
+        depth, arguments, argument_start = 0, [], start + len("round(")
+        for end in range(argument_start, len(sql)):
+            if sql[end] == "(":
+                depth += 1
+            elif sql[end] == ")" and depth > 0:
+                depth -= 1
+            elif sql[end] in ",)" and depth == 0:
+                arguments.append(sql[argument_start:end].strip())
+                argument_start = end + 1
+                if sql[end] == ")":
+                    break
+
+        if len(arguments) == 2 and not (arguments[0].startswith("CAST(") and " AS NUMERIC" in arguments[0]):
+            problems.append(" ".join(sql[start:end + 1].split()))
+        start = sql.find("round(", start + 1)
+
+    return problems
+
+
+class StatementRecorder:
+    """Records the SELECT statements executed on an engine while in a with block."""
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self.before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self.before_cursor_execute)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            self.statements.append((statement, parameters))
+
+
+def query_plan(engine, statement, parameters):
+    """Returns the steps sqlite will take to run statement, eg: 'SEARCH showing USING INDEX ...'."""
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row.detail for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--verbose", action="store_true", help="print the plan of every query")
+    args = parser.parse_args()
+
+    engine = setup_database("sqlite://")
+
+    session = session_factory()
+    day = datetime.now().date()
+    seed_database(
+        session, cinemas=3, screens_per_cinema=4, films=10, showings_per_screen=6, employees=3, day=day,
+        bookings_per_showing=5)
+    ids = {
+        "film_id": session.query(Film.id).first()[0],
+        "cinema_id": session.query(Cinema.id).first()[0],
+        "screen_id": session.query(Screen.id).first()[0],
+        "day_start": datetime.combine(day, datetime.min.time()),
+    }
+    session.close()
+
+    failures = []
+    for name, (check, expected_indexes) in CHECKS.items():
+        with StatementRecorder(engine) as recorder:
+            check(ids)
+
+        plans = [query_plan(engine, statement, parameters) for statement, parameters in recorder.statements]
+        steps = [step for plan in plans for step in plan]
+        missing = {index for index in expected_indexes if not any(index in step for step in steps)}
+
+        status = "ok" if not missing else "FAILED"
+        print(f"{status:6} {name}" + (f": not using {', '.join(sorted(missing))}" if missing else ""))
+        if missing:
+            failures.append(name)
+
+        if args.verbose or missing:
+            for (statement, _), plan in zip(recorder.statements, plans):
+                print("       " + " ".join(statement.split()))
+                for step in plan:
+                    print(f"           {step}")
+
+    for name, statements in POSTGRESQL_CHECKS.items():
+        compiled = [str(statement.compile(dialect=postgresql.dialect())) for statement in statements(ids)]
+        problems = [problem for sql in compiled for problem in float_rounding(sql)]
+
+        status = "ok" if not problems else "FAILED"
+        print(f"{status:6} {name} compiles for postgresql")
+        if problems:
+            failures.append(name)
+            for problem in problems:
+                print(f"       rounds a float: {problem[:200]}")
+
+    if failures:
+        raise SystemExit(f"{len(failures)} checks failed")
+
+
+if __name__ == "__main__":
+    main()
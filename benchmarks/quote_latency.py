@@ -0,0 +1,83 @@
+"""Times how long the booking dialog takes to re-price a booking each time the seats change.
+
+Compares walking from the showing to its city's prices on every change, as
+Booking.calculate_booking_price does, with reusing the showing's PricingContext.
+Both are checked to give the same price for every showing and seat count first.
+
+Run from the root of the repo with:
+    python -m benchmarks.quote_latency [--quotes 20000]
+"""
+import argparse
+import itertools
+import random
+import statistics
+import time
+
+from sqlalchemy.orm import joinedload
+
+from benchmarks.seed import setup_database, seed_database
+from database_models import session_factory, Booking, Cinema, PricingContext, Screen, Showing
+
+SEAT_COUNTS = range(0, 11)  # What the dialog's spinboxes allow
+
+
+def time_quotes(quote, seats):
+    """Returns the µs taken by each call of quote, one per set of seats."""
+    timings = []
+    for lower, upper, vip in seats:
+        start = time.perf_counter()
+        quote(lower, upper, vip)
+        timings.append((time.perf_counter() - start) * 1_000_000)
+
+    return timings
+
+
+def percentile(timings, fraction):
+    timings = sorted(timings)
+    return timings[min(int(len(timings) * fraction), len(timings) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quotes", type=int, default=20000, help="number of seat changes to price")
+    args = parser.parse_args()
+
+    setup_database("sqlite://")
+    session = session_factory()
+    seed_database(session, cinemas=2, screens_per_cinema=3, films=5, showings_per_screen=6)
+    session.close()
+
+    # Loaded the way the booking dialog gets them, with the city already there
+    session = session_factory()
+    showings = session.query(Showing).options(
+        joinedload(Showing.screen).joinedload(Screen.cinema).joinedload(Cinema.city)).all()
+
+    mismatches = 0
+    for showing in showings:
+        pricing = PricingContext.for_showing(showing)
+        for seats in itertools.product(SEAT_COUNTS, repeat=3):
+            if pricing.price(*seats) != Booking.calculate_booking_price(showing, *seats):
+                mismatches += 1
+
+    if mismatches:
+        raise SystemExit(f"The pricing context gave a different price for {mismatches} bookings")
+
+    showing = random.choice(showings)
+    seats = [tuple(random.choice(SEAT_COUNTS) for _ in range(3)) for _ in range(args.quotes)]
+    pricing = PricingContext.for_showing(showing)
+
+    results = {
+        "walking the showing": time_quotes(
+            lambda lower, upper, vip: Booking.calculate_booking_price(showing, lower, upper, vip), seats),
+        "pricing context": time_quotes(pricing.price, seats),
+    }
+    session.close()
+
+    for name, timings in results.items():
+        print(
+            f"{name:20} p50 {statistics.median(timings):6.2f}µs  p95 {percentile(timings, 0.95):6.2f}µs"
+            f"  max {max(timings):8.2f}µs  ({len(timings)} quotes)")
+
+
+if __name__ == "__main__":
+    main()
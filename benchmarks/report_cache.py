@@ -0,0 +1,180 @@
+"""Checks that cached reports are only invalidated by changes to the dates they cover, and times them.
+
+Seeds last month and the start of this month, then runs last month's reports
+twice, uncached and cached. Booking this month must leave them cached, while
+booking, cancelling or moving a showing last month must invalidate them, while
+adding or renaming a film or employee must only invalidate the reports listing
+them. Every cached report is compared with running it uncached.
+Deleting a film with booked showings must leave the daily revenue as
+rebuilding it would.
+
+Run from the root of the repo with:
+    python -m benchmarks.report_cache [--bookings-per-showing 10]
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.seed import setup_database, seed_database
+from sqlalchemy import select
+
+from database_models import (
+    session_factory, session_scope, invalidate_report_cache, rebuild_daily_revenue, Authority, DailyRevenue, Film,
+    ReportCache, Showing, User)
+from database_models.daily_revenue import KEY_COLUMNS, TOTAL_COLUMNS
+from services import book_seats, cancel_booking, run_report
+from services.reports import cached_report
+
+REPORTS = [("MONTHLY_REVENUE", True), ("EMPLOYEE_BOOKINGS", True), ("TOP_REVENUE", False), ("BOOKINGS_PER_FILM", False)]
+
+
+def timed_report(report_type, month, year, use_cache=True):
+    """Returns the report and the ms it took."""
+    start = time.perf_counter()
+    report = run_report(report_type, month, year, use_cache=use_cache)
+    return report, (time.perf_counter() - start) * 1000
+
+
+def cached_types():
+    with session_scope() as session:
+        return sorted(
+            report_type for report_type, in
+            session.query(ReportCache.report_type).filter(ReportCache.result.is_not(None)))
+
+
+def rollup_matches_rebuild():
+    """Checks the daily revenue kept up to date by the flush listener is the same as rebuilding it."""
+    table = DailyRevenue.__table__
+    rows = select(*(table.c[column] for column in KEY_COLUMNS + TOTAL_COLUMNS))
+
+    session = session_factory()
+    try:
+        kept = sorted(session.execute(rows).all())
+        rebuild_daily_revenue(session.connection())
+        return kept == sorted(session.execute(rows).all())
+    finally:
+        session.rollback()
+        session.close()
+
+
+def showing_on(day):
+    with session_scope() as session:
+        return session.query(Showing).filter(
+            Showing.show_time >= day, Showing.show_time < day + timedelta(days=1)).first()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bookings-per-showing", type=int, default=10)
+    parser.add_argument("--database", default="sqlite://", help="database uri, it is emptied first")
+    args = parser.parse_args()
+
+    setup_database(args.database)
+
+    this_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last_month = (this_month - timedelta(days=1)).replace(day=1)
+    session = session_factory()
+    seed_database(
+        session, cinemas=7, screens_per_cinema=6, films=40, showings_per_screen=8, employees=20, cities=3,
+        day=last_month.date(), days=(this_month - last_month).days + 3, bookings_per_showing=args.bookings_per_showing)
+    employee_id = session.query(User.id).first()[0]
+    session.close()
+
+    failures = []
+
+    def check(name, passed):
+        print(f"{'ok' if passed else 'FAILED':6} {name}")
+        if not passed:
+            failures.append(name)
+
+    def check_reports(name):
+        """Runs every report for last month, checking each against running it uncached."""
+        for report_type, _ in REPORTS:
+            cached, _ = timed_report(report_type, last_month.month, last_month.year)
+            uncached, _ = timed_report(report_type, last_month.month, last_month.year, use_cache=False)
+            check(f"{name}: {report_type} matches running it uncached", cached == uncached)
+
+    for report_type, _ in REPORTS:
+        _, first_ms = timed_report(report_type, last_month.month, last_month.year)
+        _, repeat_ms = timed_report(report_type, last_month.month, last_month.year)
+        print(f"       {report_type}: first run {first_ms:6.1f}ms, repeated {repeat_ms:6.1f}ms")
+
+    everything = sorted(report_type for report_type, _ in REPORTS)
+    monthly = sorted(report_type for report_type, is_monthly in REPORTS if is_monthly)
+    check("every report is cached", cached_types() == everything)
+
+    book_seats(showing_on(this_month).id, employee_id, 1, 0, 0, "Cache", "0", "cache@example.com")
+    check("booking this month leaves last month's reports cached", cached_types() == monthly)
+    check_reports("after booking this month")
+
+    booking = book_seats(showing_on(last_month).id, employee_id, 2, 1, 0, "Cache", "0", "cache@example.com")
+    check("booking last month invalidates them", cached_types() == [])
+    check_reports("after booking last month")
+
+    cancel_booking(booking.id)
+    check("cancelling a booking last month invalidates them", cached_types() == [])
+    check_reports("after cancelling")
+
+    with session_scope() as session:
+        showing = session.query(Showing).filter(
+            Showing.show_time >= last_month + timedelta(days=5), Showing.show_time < this_month).first()
+        showing.show_time = this_month + (showing.show_time - last_month)
+    check("moving a showing out of last month invalidates them", cached_types() == [])
+    check_reports("after moving a showing")
+
+    with session_scope() as session:
+        session.query(Film).first().title += " (Director's Cut)"
+    check("renaming a film only invalidates the reports listing films", cached_types() == monthly)
+    check_reports("after renaming a film")
+
+    with session_scope() as session:
+        film = session.query(Film).first()
+        session.add(Film(
+            title="Cache", year_published=film.year_published, rating=film.rating, age_rating=film.age_rating,
+            duration=film.duration, synopsis="", cast=""))
+    check("adding a film only invalidates the top revenue report", cached_types() == sorted(
+        report_type for report_type, _ in REPORTS if report_type != "TOP_REVENUE"))
+    check_reports("after adding a film")
+
+    with session_scope() as session:
+        session.add(User(username="cache", password=b"", authority=Authority.BOOKING))
+    check("adding an employee leaves every report cached", cached_types() == everything)
+
+    with session_scope() as session:
+        session.get(User, employee_id).username += " (renamed)"
+    check("renaming an employee only invalidates the employee bookings report", cached_types() == sorted(
+        report_type for report_type, _ in REPORTS if report_type != "EMPLOYEE_BOOKINGS"))
+    check_reports("after renaming an employee")
+
+    # A booking made while the report is being run, it mustn't be cached if the booking is in it
+    def run_then_book(day):
+        def run(session):
+            report = run_report("MONTHLY_REVENUE", last_month.month, last_month.year, use_cache=False)
+            book_seats(showing_on(day).id, employee_id, 1, 0, 0, "Cache", "0", "cache@example.com")
+            return report
+        return run
+
+    parameters = {"month": last_month.month, "year": last_month.year}
+    covered = (last_month.date(), this_month.date() - timedelta(days=1))
+
+    cached_report("MONTHLY_REVENUE", parameters, *covered, run_then_book(this_month))
+    check("a report is cached if a later month is booked while it runs", "MONTHLY_REVENUE" in cached_types())
+
+    with session_scope() as session:
+        invalidate_report_cache(session.connection())
+    cached_report("MONTHLY_REVENUE", parameters, *covered, run_then_book(last_month))
+    check("a report invalidated while it runs isn't cached", "MONTHLY_REVENUE" not in cached_types())
+    check_reports("after booking while running")
+
+    # Film.showings doesn't cascade, so its showings and their bookings are kept without a film
+    with session_scope() as session:
+        session.delete(session.get(Film, showing_on(last_month).film_id))
+    check("deleting a film with booked showings leaves the rollup as rebuilding it would", rollup_matches_rebuild())
+    check_reports("after deleting a film")
+
+    if failures:
+        raise SystemExit(f"{len(failures)} checks failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Times rendering a very large report to a PDF, and how much memory it takes.
+
+Rows are made up by a generator, so the only rows held in memory are those the
+renderer keeps itself. Checks that the column headings were written at the top
+of every page. With --memory, the peak memory allocated is traced too, which
+makes rendering a lot slower. With --compare, the report is also rendered the
+way it used to be, as one PrettyTable string written in a single call.
+
+Run from the root of the repo with:
+    python -m benchmarks.report_pdf [--rows 100000] [--compare] [--memory] [--output report.pdf]
+"""
+import argparse
+import time
+import tracemalloc
+
+from fpdf import FPDF
+
+from services import Report, ReportPDF
+from services.report_pdf import FORMATTERS
+
+FIELD_NAMES = ["Film", "Lower Hall", "Upper Gallery", "VIP", "Total Revenue"]
+
+
+def generate_rows(count):
+    for i in range(count):
+        yield [f"Benchmark Film {i} ({1950 + i % 70})", i % 97, i % 53, i % 11, (i % 10007) * 1.37]
+
+
+class CountingReportPDF(ReportPDF):
+    """Counts the pages the column headings were written on."""
+    pages_with_headings = 0
+
+    def header(self):
+        super().header()
+        if self.column_widths:
+            self.pages_with_headings += 1
+
+
+def measure(render, memory):
+    """Returns the result of render(), the seconds it took and, if memory is set,
+    the peak MB allocated while running it (tracing allocations makes it a lot slower)."""
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = render()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+
+    return result, seconds, f", peak {peak / 1024 / 1024:.1f}MB allocated" if memory else ""
+
+
+def render_with_prettytable(rows):
+    from prettytable import PrettyTable
+
+    table = PrettyTable(custom_format={"Total Revenue": lambda f, v: f"£{v:.2f}"})
+    table.field_names = FIELD_NAMES
+    table.add_rows(list(rows))
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("courier", "", 10)
+    pdf.write(text=table.get_string())
+    return pdf.output()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--compare", action="store_true", help="also render the report the old way")
+    parser.add_argument("--memory", action="store_true", help="trace the memory allocated while rendering")
+    parser.add_argument("--output", help="save the rendered pdf here")
+    args = parser.parse_args()
+
+    report = Report(
+        title=f"Benchmark report of {args.rows} rows", field_names=FIELD_NAMES, rows=None,
+        default_filename="benchmark")
+
+    def render():
+        pdf = CountingReportPDF(report.title, report.field_names, FORMATTERS)
+        pdf.write_rows(generate_rows(args.rows))
+        return pdf, pdf.output()
+
+    (pdf, output), seconds, peak = measure(render, args.memory)
+    print(
+        f"streamed    {args.rows} rows, {pdf.page} pages, {len(output) / 1024 / 1024:.1f}MB pdf"
+        f" in {seconds:.2f}s{peak}")
+
+    if args.output:
+        with open(args.output, "wb") as file:
+            file.write(output)
+
+    if args.compare:
+        old_output, seconds, peak = measure(lambda: render_with_prettytable(generate_rows(args.rows)), args.memory)
+        print(
+            f"prettytable {args.rows} rows, {len(old_output) / 1024 / 1024:.1f}MB pdf"
+            f" in {seconds:.2f}s{peak}")
+
+    if pdf.pages_with_headings != pdf.page:
+        raise SystemExit(f"Only {pdf.pages_with_headings} of the {pdf.page} pages have the column headings")
+
+
+if __name__ == "__main__":
+    main()
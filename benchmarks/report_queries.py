@@ -0,0 +1,157 @@
+"""Checks that the reports run from the daily revenue match running them from every booking, and times both.
+
+The versions run from the bookings are how the reports used to be run: every
+booking in the period is loaded, and the revenue reports price each one with
+Booking.calculate_row_prices. Both versions are run against the same seeded
+sqlite database and must give exactly the same rows.
+
+Run from the root of the repo with:
+    python -m benchmarks.report_queries [--days 30] [--bookings-per-showing 10]
+"""
+import argparse
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy.sql import and_, desc, func
+
+from benchmarks.seed import setup_database, seed_database
+from database_models import session_factory, Booking, Cinema, Film, Screen, Showing, User
+from misc.constants import FILM_FORMAT
+from services import get_month_start_end
+from services.reports import (
+    bookings_per_film_report, employee_bookings_report, monthly_revenue_report, top_revenue_report)
+
+
+def bookings_per_film_from_bookings(session):
+    lower = func.sum(Booking.lower_booked)
+    upper = func.sum(Booking.upper_booked)
+    vip = func.sum(Booking.vip_booked)
+
+    query = session.query(Film, lower, upper, vip, (lower + upper + vip).label("total_b"))
+    query = query.join(Film.showings).join(Showing.bookings).group_by(Film.id)
+    query = query.order_by(desc("total_b"), Film.id)
+
+    return [[FILM_FORMAT.format(film), *booking_values] for film, *booking_values in query.all()]
+
+
+def monthly_revenue_from_bookings(session, month, year):
+    month_start, month_end = get_month_start_end(month, year)
+
+    cinemas = session.query(Cinema).all()
+
+    query = session.query(
+        Screen.cinema_id, Booking.showing_id, Booking.lower_booked, Booking.upper_booked, Booking.vip_booked)
+    query = query.join(Booking.showing).join(Showing.screen).filter(and_(
+        Showing.show_time >= month_start,
+        Showing.show_time <= month_end))
+    rows = query.all()
+    prices = Booking.calculate_row_prices(session, [row[1:] for row in rows])
+
+    revenue = defaultdict(float)
+    for row, price in zip(rows, prices):
+        revenue[row.cinema_id] += price
+
+    cinema_revenue = [[cinema.name, round(revenue[cinema.id], 2)] for cinema in cinemas]
+    cinema_revenue.sort(key=lambda row: row[1], reverse=True)
+
+    return cinema_revenue
+
+
+def top_revenue_from_bookings(session, top_n):
+    films = session.query(Film).all()
+
+    query = session.query(
+        Showing.film_id, Booking.showing_id, Booking.lower_booked, Booking.upper_booked, Booking.vip_booked)
+    query = query.join(Booking.showing)
+    rows = query.all()
+    prices = Booking.calculate_row_prices(session, [row[1:] for row in rows])
+
+    revenue = defaultdict(float)
+    for row, price in zip(rows, prices):
+        revenue[row.film_id] += price
+
+    film_revenue = [[FILM_FORMAT.format(film), round(revenue[film.id], 2)] for film in films]
+    film_revenue.sort(key=lambda row: row[1], reverse=True)
+
+    return film_revenue[:top_n]
+
+
+def employee_bookings_from_bookings(session, month, year):
+    month_start, month_end = get_month_start_end(month, year)
+
+    query = session.query(User, func.count(Booking.id).label("booking_count"))
+    query = query.join(User.bookings).join(Booking.showing)
+    query = query.filter(and_(
+            Showing.show_time >= month_start,
+            Showing.show_time <= month_end))
+    query = query.group_by(User.id).order_by(desc("booking_count"), User.id)
+
+    return [[user.username, total_bookings] for user, total_bookings in query.all()]
+
+
+# name: (report run from the daily revenue, the same report run from the bookings),
+# both called with (session, month, year)
+CHECKS = {
+    "bookings per film": (
+        lambda session, month, year: bookings_per_film_report(session).rows,
+        lambda session, month, year: bookings_per_film_from_bookings(session)),
+    "monthly revenue": (lambda *args: monthly_revenue_report(*args).rows, monthly_revenue_from_bookings),
+    "top revenue film": (
+        lambda session, month, year: top_revenue_report(session).rows,
+        lambda session, month, year: top_revenue_from_bookings(session, 1)),
+    "top 10 revenue films": (
+        lambda session, month, year: top_revenue_report(session, top_n=10).rows,
+        lambda session, month, year: top_revenue_from_bookings(session, 10)),
+    "employee bookings": (
+        lambda *args: employee_bookings_report(*args).rows, employee_bookings_from_bookings),
+}
+
+
+def timed(function, *args):
+    """Returns the result of function(*args) and the ms it took, using a fresh session."""
+    session = session_factory()
+    try:
+        start = time.perf_counter()
+        result = function(session, *args)
+        return result, (time.perf_counter() - start) * 1000
+    finally:
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=30, help="days of showings to seed, from the 1st of this month")
+    parser.add_argument("--bookings-per-showing", type=int, default=10)
+    parser.add_argument("--database", default="sqlite://", help="database uri, it is emptied first")
+    args = parser.parse_args()
+
+    setup_database(args.database)
+
+    today = datetime.now()
+    session = session_factory()
+    seed_database(
+        session, cinemas=7, screens_per_cinema=6, films=40, showings_per_screen=8, employees=20, cities=3,
+        day=today.replace(day=1).date(), days=args.days, bookings_per_showing=args.bookings_per_showing)
+    bookings = session.query(Booking).count()
+    session.close()
+    print(f"Seeded {bookings} bookings over {args.days} days")
+
+    failures = []
+    for name, (from_revenue, from_bookings) in CHECKS.items():
+        revenue_rows, revenue_ms = timed(from_revenue, today.month, today.year)
+        booking_rows, booking_ms = timed(from_bookings, today.month, today.year)
+
+        status = "ok" if revenue_rows == booking_rows else "FAILED"
+        print(f"{status:6} {name}: daily revenue {revenue_ms:8.1f}ms, bookings {booking_ms:8.1f}ms")
+        if revenue_rows != booking_rows:
+            failures.append(name)
+            for revenue_row, booking_row in zip(revenue_rows, booking_rows):
+                print(f"       {revenue_row} != {booking_row}" if revenue_row != booking_row else f"       {revenue_row}")
+
+    if failures:
+        raise SystemExit(f"{len(failures)} reports don't match running them from the bookings")
+
+
+if __name__ == "__main__":
+    main()
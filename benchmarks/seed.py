@@ -0,0 +1,96 @@
+"""Helpers for pointing the application at a scratch database and filling it with test data."""
+import os
+import random
+from datetime import datetime, timedelta, time
+
+from sqlalchemy import insert
+
+from database_models import (
+    Base, session_factory, create_database_engine, AgeRatings, Authority, Booking, Cinema, City, Film, Screen, Showing,
+    User, rebuild_daily_revenue)
+from database_models.migrations import backfill_seat_counters
+
+
+def setup_database(uri):
+    """Empties the database at uri and makes every session_factory session use it.
+
+    Sqlite database files are deleted first, so no stale write-ahead log is left behind."""
+    if uri.startswith("sqlite:///"):
+        path = uri[len("sqlite:///"):]
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    engine = create_database_engine(uri)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session_factory.configure(bind=engine)
+
+    return engine
+
+
+def seed_database(
+        session, cinemas=1, screens_per_cinema=1, films=1, showings_per_screen=1, employees=1,
+        capacity=(60, 130, 10), day=None, bookings_per_showing=0, days=1, cities=1):
+    """Fills the database with cities, cinemas, screens, films, employees and showings
+    on each of the given number of days, starting with day.
+
+    Showings are spread evenly through opening hours in each screen, and each gets
+    bookings_per_showing bookings of a few seats made by random employees. Cinemas
+    are shared out between the cities, which each have different prices. Returns a
+    tuple of (showing ids, employee ids)."""
+    day = day or datetime.now().date()
+    lower_capacity, upper_capacity, vip_capacity = capacity
+
+    seeded_cities = [
+        City(
+            name=f"Seed City {i}", morning_price=round(5.0 + 0.37 * i, 2),
+            afternoon_price=round(6.0 + 0.41 * i, 2), evening_price=round(7.0 + 0.53 * i, 2))
+        for i in range(cities)]
+    seeded_films = [
+        Film(
+            title=f"Seed Film {i}", year_published=2022, rating=0.5, age_rating=AgeRatings.U,
+            duration=timedelta(minutes=90), synopsis="-", cast="-")
+        for i in range(films)]
+
+    seeded_cinemas = []
+    showings = []
+    for i in range(cinemas):
+        cinema = Cinema(name=f"Seed Cinema {i}", city=seeded_cities[i % cities])
+        seeded_cinemas.append(cinema)
+
+        for j in range(screens_per_cinema):
+            screen = Screen(
+                name=f"Screen {j}", cinema=cinema,
+                lower_capacity=lower_capacity, upper_capacity=upper_capacity, vip_capacity=vip_capacity)
+
+            # 8am until 10:30pm leaves room for a 90 minute film before midnight
+            gap = timedelta(minutes=(14 * 60 + 30) // max(showings_per_screen, 1))
+            for d in range(days):
+                start = datetime.combine(day + timedelta(days=d), time(hour=8))
+                for k in range(showings_per_screen):
+                    showings.append(Showing(screen=screen, film=random.choice(seeded_films), show_time=start + gap * k))
+
+    password = User.hash_password("seed")  # bcrypt is slow, so every employee shares one hash
+    users = [
+        User(username=f"seed{i}", password=password, cinema=seeded_cinemas[i % cinemas], authority=Authority.BOOKING)
+        for i in range(employees)]
+
+    session.add_all(seeded_cities + seeded_films + seeded_cinemas + showings + users)
+    session.flush()
+
+    # Inserted in bulk as there can be hundreds of thousands, which skips the flush
+    # listeners, so the seat counters and daily revenue are filled in afterwards like a migration would
+    bookings = [
+        {
+            "showing_id": showing.id, "employee_id": random.choice(users).id, "name": "Seed", "phone": "0",
+            "email": "seed@example.com", "lower_booked": random.randint(0, 2), "upper_booked": random.randint(0, 2),
+            "vip_booked": random.randint(0, 1)}
+        for showing in showings for _ in range(bookings_per_showing)]
+    if bookings:
+        session.execute(insert(Booking), bookings)
+        backfill_seat_counters(session.connection())
+        rebuild_daily_revenue(session.connection())
+    session.commit()
+
+    return [showing.id for showing in showings], [user.id for user in users]
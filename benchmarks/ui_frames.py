@@ -0,0 +1,109 @@
+"""Times how long the UI is blocked when flipping pages in NewBooking and switching windows from the menu.
+
+Each action is run through the real CinemaApplication against a seeded sqlite
+database, then timed until Tk has finished redrawing. The first time a window
+is built is reported as cold, after that it is reused from the window cache and
+reported as warm. The check fails if the 95th percentile of the warm timings is
+over the frame budget, which is what happens when switching or paging starts
+rebuilding widgets or waiting on the database again.
+
+Needs a display, so won't run on a headless machine. Run from the root of the repo with:
+    python -m benchmarks.ui_frames [--budget-ms 16.7] [--repeat 20]
+"""
+import argparse
+import statistics
+import time
+
+import database_models
+from benchmarks.seed import setup_database, seed_database
+from database_models import session_factory, User
+from windows import CinemaApplication, FilmShowingWindow, FilmWindow, NewBooking
+
+FRAME_BUDGET_MS = 1000 / 60
+
+
+def wait_until_idle(root, timeout=10):
+    """Runs the Tk event loop until nothing is left loading in the background."""
+    deadline = time.perf_counter() + timeout
+    while root.background_tasks.callbacks or root.image_loader.pending:
+        if time.perf_counter() > deadline:
+            raise SystemExit("Timed out waiting for background tasks to finish")
+        root.update()
+        time.sleep(0.005)
+
+    root.update()
+
+
+def timed(root, action):
+    """Returns the ms taken to run action and redraw the window afterwards."""
+    start = time.perf_counter()
+    action()
+    root.update_idletasks()
+    return (time.perf_counter() - start) * 1000
+
+
+def percentile(timings, fraction):
+    timings = sorted(timings)
+    return timings[min(int(len(timings) * fraction), len(timings) - 1)]
+
+
+def describe(name, timings):
+    return (
+        f"{name:28} p50 {statistics.median(timings):7.2f}ms  p95 {percentile(timings, 0.95):7.2f}ms"
+        f"  max {max(timings):7.2f}ms  ({len(timings)} runs)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=FRAME_BUDGET_MS, help="frame budget for warm actions")
+    parser.add_argument("--repeat", type=int, default=20, help="times to repeat each warm action")
+    args = parser.parse_args()
+
+    engine = setup_database("sqlite://")
+    database_models.session.bind = engine  # The windows use the module level session
+
+    session = session_factory()
+    seed_database(session, cinemas=1, screens_per_cinema=6, films=40, showings_per_screen=8, employees=1)
+    session.close()
+
+    root = CinemaApplication()
+    root.current_window = None
+    root.current_user = database_models.session.query(User).first()
+    root.add_menu()
+
+    results = {}
+
+    # Cold: every window is built for the first time
+    for window in (NewBooking, FilmWindow, FilmShowingWindow):
+        results.setdefault("switch window, cold", []).append(timed(root, lambda: root.switch_window(window)))
+        wait_until_idle(root)
+
+    # Warm: the windows come from the cache
+    for _ in range(args.repeat):
+        for window in (NewBooking, FilmWindow, FilmShowingWindow):
+            results.setdefault("switch window, warm", []).append(timed(root, lambda: root.switch_window(window)))
+            wait_until_idle(root)
+
+    root.switch_window(NewBooking)
+    wait_until_idle(root)
+    booking = root.current_window
+    for _ in range(args.repeat):
+        # Flip forwards and back, waiting each time so the neighbouring pages are prefetched
+        for flip in (booking.next_page, booking.prev_page):
+            results.setdefault("flip page, warm", []).append(timed(root, flip))
+            wait_until_idle(root)
+
+    root.destroy()
+
+    failures = []
+    for name, timings in results.items():
+        print(describe(name, timings))
+        if name.endswith("warm") and percentile(timings, 0.95) > args.budget_ms:
+            failures.append(name)
+
+    if failures:
+        raise SystemExit(f"{', '.join(failures)} over the {args.budget_ms:.1f}ms frame budget")
+
+
+if __name__ == "__main__":
+    main()
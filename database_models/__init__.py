@@ -1,6 +1,6 @@
 from contextlib import contextmanager
 
-from sqlalchemy import create_engine, Table
+from sqlalchemy import create_engine, event, Table
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -15,27 +15,57 @@ from database_models.genre import Genre
 from database_models.screen import Screen
 from database_models.showing import Showing
 from database_models.user import User
+from database_models.daily_revenue import DailyRevenue
+from database_models.report_cache import ReportCache
 
 # Enums
 from database_models.film import AgeRatings
 from database_models.user import Authority
 
+# Helpers
+from database_models.booking import PriceLookup, PricingContext
+from database_models.daily_revenue import rebuild_daily_revenue
+from database_models.report_cache import invalidate_report_cache
+
 from config import DATABASE_URI
 
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+
+def create_database_engine(uri):
+    """Creates an engine for the database at uri.
+
+    Sqlite databases are switched to write-ahead logging so that terminals can keep
+    reading while another one is booking, and writers wait for the lock instead of
+    failing immediately."""
+    new_engine = create_engine(uri)
+
+    if new_engine.dialect.name == "sqlite":
+        @event.listens_for(new_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.close()
+
+    return new_engine
+
+
 if DATABASE_URI:
     # You can define the database uri in the config/config.json file.
     # It needs to be in the format explained here: https://docs.sqlalchemy.org/en/14/core/engines.html#sqlite
-    engine = create_engine(DATABASE_URI)
+    engine = create_database_engine(DATABASE_URI)
 else:
     # if no database is specified, use in-memory testing db
-    engine = create_engine("sqlite://")
+    engine = create_database_engine("sqlite://")
 
 session_factory = sessionmaker(bind=engine, expire_on_commit=False)
 Session = scoped_session(session_factory)
 
 # Issues all CREATE TABLE commands to database connected to in create_engine
 # If a table already exists in that database, this does not try to override it.
-# You will need to manually issue ALTER TABLE sql to the database, or delete it and start over
+# To add new columns and indexes to an existing database run migrate_db.py
+# (see database_models/migrations.py)
 Base.metadata.create_all(engine)
 
 session = Session()
@@ -46,8 +76,11 @@ def session_scope():
 
     When you use this method to create a session to access the database it will always
     commit the session for you at the end. If any errors occur during the session it will
-    ensure the session still gets closed."""
-    session = Session()
+    ensure the session still gets closed.
+
+    The session is independent of the module level session used by the windows,
+    so closing it does not detach the objects they are holding on to."""
+    session = session_factory()
     try:
         yield session
         session.commit()
@@ -1,9 +1,23 @@
-from datetime import time
+from collections import defaultdict, namedtuple
 
-from sqlalchemy import Column, ForeignKey, Integer, String
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, ForeignKey, Index, Integer, Numeric, String, event, inspect
+from sqlalchemy.orm import relationship, Session
+from sqlalchemy.sql import case, cast, extract, func
 
 from database_models import Base
+from database_models.cinema import Cinema
+from database_models.city import City
+from database_models.screen import Screen
+from database_models.showing import Showing
+from misc.constants import (
+    MORNING, AFTERNOON, EVENING, EIGHT_AM, NOON, FIVE_PM, UPPER_MULTIPLIER, VIP_MULTIPLIER)
+from misc.utils import get_time_band
+
+SEAT_COUNTERS = (
+    ("lower_booked", "lower_sold"),
+    ("upper_booked", "upper_sold"),
+    ("vip_booked", "vip_sold")
+)
 
 
 class Booking(Base):
@@ -13,6 +27,12 @@ class Booking(Base):
     payment handler securely.
     """
     __tablename__ = "booking"
+    __table_args__ = (
+        # Bookings for a showing, eg: when summing the seats sold
+        Index("ix_booking_showing_id", "showing_id"),
+        # Bookings made by an employee, the showing is included so reports can join without a lookup
+        Index("ix_booking_employee_id_showing_id", "employee_id", "showing_id"),
+    )
 
     id = Column(Integer, primary_key=True)
     showing_id = Column(Integer, ForeignKey("showing.id"))
@@ -35,24 +55,202 @@ class Booking(Base):
 
     @staticmethod
     def calculate_booking_price(showing, lower_booked, upper_booked, vip_booked):
-        city = showing.screen.cinema.city
-
-        show_time = time(
-            hour=showing.show_time.hour,
-            minute=showing.show_time.minute)
-
-        if time(8, 0, 0) <= show_time < time(12, 0, 0):
-            # Starts between 8am-11:59am
-            base_price = city.morning_price
-        elif time(12, 0, 0) <= show_time < time(17, 0, 0):
-            # Starts between 12pm-4:59pm
-            base_price = city.afternoon_price
-        elif time(17, 0, 0) <= show_time <= time(23, 59, 59):
-            # Starts between 5pm-12am
-            base_price = city.evening_price
-
-        price = base_price * lower_booked
-        price += base_price * upper_booked * 1.2
-        price += (base_price * vip_booked * 1.2) * 1.2
-
-        return round(price, 2)
\ No newline at end of file
+        return PricingContext.for_showing(showing).price(lower_booked, upper_booked, vip_booked)
+
+    @staticmethod
+    def price_from_base(base_price, lower_booked, upper_booked, vip_booked):
+        """Prices a booking once the base price of its showing is known."""
+        return PricingContext(base_price, UPPER_MULTIPLIER, VIP_MULTIPLIER).price(lower_booked, upper_booked, vip_booked)
+
+    @staticmethod
+    def calculate_booking_prices(session, showings, lower_booked, upper_booked, vip_booked, lookup=None):
+        """Prices many bookings at once, giving the same results as calculate_booking_price.
+
+        The arguments are columns: showings is a sequence of Showings (or showing ids) and
+        the booked arguments are sequences of seat counts, all of the same length. Base
+        prices are resolved through a PriceLookup (built here if one isn't provided) so
+        no relationships are loaded per booking.
+
+        To price (showing, lower_booked, upper_booked, vip_booked) rows use calculate_row_prices."""
+        showing_ids = [getattr(showing, "id", showing) for showing in showings]
+
+        if lookup is None:
+            lookup = PriceLookup(session, showing_ids)
+
+        base_prices = [lookup[showing_id] for showing_id in showing_ids]
+
+        lower_prices = [base * lower for base, lower in zip(base_prices, lower_booked)]
+        upper_prices = [base * upper * UPPER_MULTIPLIER for base, upper in zip(base_prices, upper_booked)]
+        vip_prices = [(base * vip * UPPER_MULTIPLIER) * VIP_MULTIPLIER for base, vip in zip(base_prices, vip_booked)]
+
+        return [
+            round(lower + upper + vip, 2)
+            for lower, upper, vip in zip(lower_prices, upper_prices, vip_prices)]
+
+    @staticmethod
+    def calculate_row_prices(session, rows, lookup=None):
+        """Prices many (showing, lower_booked, upper_booked, vip_booked) rows at once."""
+        if not rows:
+            return []
+
+        return Booking.calculate_booking_prices(session, *zip(*rows), lookup=lookup)
+
+
+class PricingContext(namedtuple("PricingContext", ["base_price", "upper_multiplier", "vip_multiplier"])):
+    """Everything needed to price a booking for one showing.
+
+    Resolving it walks from the showing to its city's prices, so it is done once
+    per showing, then price can be called for every change to the seats booked
+    without touching the ORM."""
+    __slots__ = ()
+
+    @classmethod
+    def for_showing(cls, showing):
+        return cls.for_screen(showing.screen, showing.show_time)
+
+    @classmethod
+    def for_screen(cls, screen, show_time):
+        """For a showing at show_time on screen, eg: as a showing was before it was moved."""
+        city = screen.cinema.city
+        return cls(city.get_price(get_time_band(show_time)), UPPER_MULTIPLIER, VIP_MULTIPLIER)
+
+    def price(self, lower_booked, upper_booked, vip_booked):
+        price = self.base_price * lower_booked
+        price += self.base_price * upper_booked * self.upper_multiplier
+        price += (self.base_price * vip_booked * self.upper_multiplier) * self.vip_multiplier
+
+        return round(price, 2)
+
+
+class PriceLookup:
+    """Table of the base ticket price of each showing.
+
+    Built with one query per chunk of showings, joining each showing to the
+    prices of the city its cinema is in and resolving its time band once.
+    If showing_ids isn't provided, every showing is included."""
+    CHUNK_SIZE = 500  # Keeps IN clauses under the bound parameter limit of older sqlite versions
+
+    def __init__(self, session, showing_ids=None):
+        self.base_prices = {}
+
+        if showing_ids is None:
+            self._load(session, None)
+            return
+
+        showing_ids = list(set(showing_ids))
+        for i in range(0, len(showing_ids), self.CHUNK_SIZE):
+            self._load(session, showing_ids[i:i + self.CHUNK_SIZE])
+
+    def __getitem__(self, showing_id):
+        return self.base_prices[showing_id]
+
+    def _load(self, session, showing_ids):
+        query = session.query(
+            Showing.id, Showing.show_time, City.morning_price, City.afternoon_price, City.evening_price)
+        query = query.join(Showing.screen).join(Screen.cinema).join(Cinema.city)
+
+        if showing_ids is not None:
+            query = query.filter(Showing.id.in_(showing_ids))
+
+        for showing_id, show_time, *prices in query:
+            prices = dict(zip((MORNING, AFTERNOON, EVENING), prices))
+            self.base_prices[showing_id] = prices[get_time_band(show_time)]
+
+
+def show_time_band(morning=MORNING, afternoon=AFTERNOON, evening=EVENING):
+    """SQL expression for the time band of a showing, the same as get_time_band works out.
+
+    Gives the value passed for the band the showing starts in, eg: the city's price
+    for it. Showings outside of opening hours are NULL."""
+    show_hour = extract("hour", Showing.show_time)
+    return case(
+        (show_hour < EIGHT_AM.hour, None),
+        (show_hour < NOON.hour, morning),
+        (show_hour < FIVE_PM.hour, afternoon),
+        else_=evening)
+
+
+def booking_price():
+    """SQL expression for the price of a booking, the same as Booking.calculate_booking_price gives.
+
+    The query it is used in must join each booking to its showing, and the showing
+    to the city its cinema is in. The price is put together in the same order as in
+    python and rounded to the penny for each booking before being summed.
+
+    sqlite and python can round halfway values differently, but prices stored in
+    whole pennies never make a booking cost a half penny (the VIP multiplier adds
+    at most 4 decimal places, never ending in 50), so the results are the same.
+
+    The prices are floats, and postgresql can only round a float to a whole number,
+    so the price is cast to a fixed point number with those 4 decimal places first."""
+    base_price = show_time_band(City.morning_price, City.afternoon_price, City.evening_price)
+
+    price = base_price * Booking.lower_booked
+    price += base_price * Booking.upper_booked * UPPER_MULTIPLIER
+    price += (base_price * Booking.vip_booked * UPPER_MULTIPLIER) * VIP_MULTIPLIER
+
+    return func.round(cast(price, Numeric(10, 4)), 2)
+
+
+def _booking_values(booking, current):
+    """Returns the showing and seat counts of a booking, either as they
+    are now or as they were when last loaded from the database."""
+    state = inspect(booking)
+
+    def value(attr):
+        history = state.attrs[attr].history
+        if current:
+            return history.added[0] if history.added else getattr(booking, attr)
+        if history.deleted:
+            return history.deleted[0]
+        return history.unchanged[0] if history.unchanged else None
+
+    showing = value("showing")
+    if showing is None:
+        showing_id = value("showing_id")
+        showing = state.session.get(Showing, showing_id) if showing_id is not None else None
+
+    return showing, [value(booked) or 0 for booked, _ in SEAT_COUNTERS]
+
+
+@event.listens_for(Session, "before_flush")
+def update_seats_sold(session, flush_context, instances):
+    """Keeps the seat counters on each showing in step with its bookings.
+
+    Runs before every flush, so it covers bookings that are created,
+    edited, cancelled or removed by the Showing.bookings delete cascade.
+    Persisted showings are updated with an 'x = x + n' expression so that
+    concurrent bookings from other terminals are never overwritten."""
+    deltas = defaultdict(lambda: [0, 0, 0])
+
+    def apply(showing, counts, sign):
+        if showing is None:
+            return
+        for i, count in enumerate(counts):
+            deltas[showing][i] += sign * count
+
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            apply(*_booking_values(obj, current=True), 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            apply(*_booking_values(obj, current=False), -1)
+
+    for obj in session.dirty:
+        if isinstance(obj, Booking) and session.is_modified(obj):
+            apply(*_booking_values(obj, current=False), -1)
+            apply(*_booking_values(obj, current=True), 1)
+
+    for showing, counts in deltas.items():
+        if showing in session.deleted:
+            continue  # Counters are going with it
+
+        for (_, sold), count in zip(SEAT_COUNTERS, counts):
+            if not count:
+                continue
+
+            if inspect(showing).persistent:
+                setattr(showing, sold, getattr(Showing, sold) + count)
+            else:
+                setattr(showing, sold, (getattr(showing, sold) or 0) + count)
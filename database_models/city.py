@@ -16,4 +16,8 @@ class City(Base):
     cinemas = relationship("Cinema", back_populates="city")
 
     def __repr__(self):
-        return f"<City(id={self.id}, name={self.name}, morning_price={self.morning_price}, afternoon_price={self.afternoon_price}, evening_price={self.evening_price})>"
\ No newline at end of file
+        return f"<City(id={self.id}, name={self.name}, morning_price={self.morning_price}, afternoon_price={self.afternoon_price}, evening_price={self.evening_price})>"
+
+    def get_price(self, time_band):
+        """Gets the base ticket price for showings starting in a time band (MORNING, AFTERNOON or EVENING)."""
+        return getattr(self, f"{time_band}_price")
@@ -0,0 +1,222 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import Column, Date, ForeignKey, Index, Integer, String, event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import and_, cast, delete, func, insert, select, update
+
+from database_models import Base
+from database_models.booking import Booking, PricingContext, booking_price, show_time_band, _booking_values
+from database_models.cinema import Cinema
+from database_models.report_cache import invalidate_report_cache
+from database_models.screen import Screen
+from database_models.showing import Showing
+from misc.utils import get_time_band
+
+KEY_COLUMNS = ("date", "cinema_id", "screen_id", "film_id", "time_band", "employee_id")
+TOTAL_COLUMNS = ("bookings", "lower_booked", "upper_booked", "vip_booked", "revenue_pence")
+# Changes to a showing that move its bookings to another row
+MOVED_ATTRIBUTES = ("show_time", "screen", "screen_id", "film", "film_id")
+
+
+class DailyRevenue(Base):
+    """Running totals of the bookings for each day, so reports don't have to read every booking.
+
+    There is a row for every (date, cinema, screen, film, time band, employee) that
+    has bookings, holding how many bookings were made, the seats booked in each area
+    and their price in pence (whole pence, so totals are exact however many rows are
+    summed). The date, cinema, screen and film are those of the showing booked.
+
+    Kept up to date by the flush listener at the bottom of this file as bookings
+    are made, edited and cancelled and as showings are moved, so it should never be
+    edited directly. Revenue is what each booking was priced at when it was made (or
+    last changed). rebuild_daily_revenue recalculates it from the bookings at the
+    current prices, it is only used by migrations and rebuild_rollups.py."""
+    __tablename__ = "daily_revenue"
+    __table_args__ = (
+        # One row per key, starting with the date so reports can find a month's rows
+        Index("ix_daily_revenue_key", *KEY_COLUMNS, unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    date = Column(Date, nullable=False)
+    cinema_id = Column(Integer, ForeignKey("cinema.id"), nullable=False)
+    screen_id = Column(Integer, ForeignKey("screen.id"), nullable=False)
+    film_id = Column(Integer, ForeignKey("film.id"), nullable=False)
+    time_band = Column(String, nullable=False)
+    employee_id = Column(Integer, ForeignKey("user.id"))
+    bookings = Column(Integer, nullable=False, default=0)
+    lower_booked = Column(Integer, nullable=False, default=0)
+    upper_booked = Column(Integer, nullable=False, default=0)
+    vip_booked = Column(Integer, nullable=False, default=0)
+    revenue_pence = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DailyRevenue(date={self.date}, cinema_id={self.cinema_id}, film_id={self.film_id}, revenue_pence={self.revenue_pence})>"
+
+
+def rebuild_daily_revenue(connection, date_from=None, date_to=None):
+    """Recalculates the daily revenue rows between the dates date_from and date_to
+    (inclusive, every date if not given) from the bookings, returning how many rows were rebuilt.
+
+    Cached reports covering those dates are invalidated too."""
+    table = DailyRevenue.__table__
+
+    key = [
+        func.date(Showing.show_time).label("date"),
+        Screen.cinema_id.label("cinema_id"),
+        Showing.screen_id.label("screen_id"),
+        Showing.film_id.label("film_id"),
+        show_time_band().label("time_band"),
+        Booking.employee_id.label("employee_id")]
+
+    bookings = select(
+        *key,
+        func.count(Booking.id),
+        func.sum(Booking.lower_booked),
+        func.sum(Booking.upper_booked),
+        func.sum(Booking.vip_booked),
+        func.sum(cast(func.round(booking_price() * 100), Integer)))
+    bookings = bookings.select_from(Booking).join(Booking.showing).join(Showing.screen)
+    bookings = bookings.join(Screen.cinema).join(Cinema.city)
+    # Showings whose film was deleted are left without one, and are left out like those outside of opening hours
+    bookings = bookings.where(show_time_band().is_not(None), Showing.film_id.is_not(None))
+
+    old_rows = delete(table)
+    if date_from is not None:
+        bookings = bookings.where(Showing.show_time >= datetime.combine(date_from, time.min))
+        old_rows = old_rows.where(table.c.date >= date_from)
+    if date_to is not None:
+        bookings = bookings.where(Showing.show_time < datetime.combine(date_to + timedelta(days=1), time.min))
+        old_rows = old_rows.where(table.c.date <= date_to)
+
+    bookings = bookings.group_by(*key)
+
+    connection.execute(old_rows)
+    invalidate_report_cache(connection, date_from, date_to)
+    return connection.execute(insert(table).from_select(KEY_COLUMNS + TOTAL_COLUMNS, bookings)).rowcount
+
+
+def _showing_key(showing, current):
+    """Returns the rollup key of a showing's bookings (all but the employee) and the PricingContext
+    they are priced with, either as the showing is now or as it was when last loaded.
+
+    Raises ValueError if the showing is outside of opening hours, or has no film or
+    screen (eg: its film was deleted), as rebuilding leaves these out."""
+    state = inspect(showing)
+
+    def old(attr):
+        history = state.attrs[attr].history
+        return history.deleted[0] if history.deleted else None
+
+    show_time, screen, film_id = showing.show_time, showing.screen, showing.film_id
+    if not current:
+        show_time = old("show_time") or show_time
+
+        if old("screen") is not None:
+            screen = old("screen")
+        elif old("screen_id") is not None:
+            screen = state.session.get(Screen, old("screen_id"))
+
+        if old("film") is not None:
+            film_id = old("film").id
+        elif old("film_id") is not None:
+            film_id = old("film_id")
+
+    if film_id is None or screen is None or screen.cinema_id is None:
+        raise ValueError("The showing has no film or screen")
+
+    key = (show_time.date(), screen.cinema_id, screen.id, film_id, get_time_band(show_time))
+    return key, PricingContext.for_screen(screen, show_time)
+
+
+def _employee_id(booking, current):
+    """Returns the employee of a booking, either as it is now or as it was when last loaded."""
+    history = inspect(booking).attrs.employee_id.history
+    if current or not history.deleted:
+        return booking.employee_id
+    return history.deleted[0]
+
+
+@event.listens_for(Session, "after_flush")
+def update_daily_revenue(session, flush_context):
+    """Adds the bookings that were flushed to the daily revenue, and takes away those
+    that were cancelled or changed.
+
+    Runs after the flush so every new booking and showing has its id. If a showing
+    with bookings is moved to another time, screen or film, its bookings are taken
+    away from the row they were in and added to the one they are in now, priced for
+    the showing as it was and as it is, just like a booking that is edited. No other
+    booking is re-priced. Cached reports covering any of the days that changed are
+    invalidated."""
+    deltas = defaultdict(lambda: [0, 0, 0, 0, 0])
+    applied = set()  # Bookings already taken away and added, so moving their showing doesn't again
+
+    def add(showing, current, employee_id, counts, sign):
+        try:
+            showing_key, pricing = _showing_key(showing, current)
+        except ValueError:
+            return  # Outside of opening hours or without a film, rebuilding leaves these out too
+
+        revenue = round(pricing.price(*counts) * 100)
+        for i, value in enumerate([1, *counts, revenue]):
+            deltas[(*showing_key, employee_id)][i] += sign * value
+
+    def apply(booking, current, sign):
+        applied.add(booking)
+        showing, counts = _booking_values(booking, current)
+        if showing is not None:
+            add(showing, current, _employee_id(booking, current), counts, sign)
+
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            apply(obj, current=True, sign=1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            apply(obj, current=False, sign=-1)
+
+    for obj in session.dirty:
+        if isinstance(obj, Booking) and session.is_modified(obj):
+            apply(obj, current=False, sign=-1)
+            apply(obj, current=True, sign=1)
+
+    applied_ids = {booking.id for booking in applied}
+    for obj in session.dirty:
+        if not isinstance(obj, Showing) or obj in session.deleted:
+            continue
+
+        state = inspect(obj)
+        if not any(state.attrs[attr].history.has_changes() for attr in MOVED_ATTRIBUTES):
+            continue
+
+        # Read as they are now the flush has been written, bookings moved to or from it are already applied
+        bookings = session.connection().execute(
+            select(Booking.id, Booking.employee_id, Booking.lower_booked, Booking.upper_booked, Booking.vip_booked)
+            .where(Booking.showing_id == obj.id))
+        for booking_id, employee_id, *counts in bookings:
+            if booking_id not in applied_ids:
+                add(obj, False, employee_id, counts, -1)
+                add(obj, True, employee_id, counts, 1)
+
+    deltas = {key: totals for key, totals in deltas.items() if any(totals)}
+    if not deltas:
+        return
+
+    connection = session.connection()
+    table = DailyRevenue.__table__
+
+    for key, totals in deltas.items():
+        matching = and_(*(table.c[column] == value for column, value in zip(KEY_COLUMNS, key)))
+        changed = connection.execute(update(table).where(matching).values({
+            column: table.c[column] + total for column, total in zip(TOTAL_COLUMNS, totals)}))
+
+        if changed.rowcount == 0:
+            connection.execute(insert(table).values({**dict(zip(KEY_COLUMNS, key)), **dict(zip(TOTAL_COLUMNS, totals))}))
+
+    # Rows whose bookings have all been cancelled or moved
+    touched_dates = {key[0] for key in deltas}
+    connection.execute(delete(table).where(table.c.date.in_(touched_dates), table.c.bookings <= 0))
+
+    for date in touched_dates:
+        invalidate_report_cache(connection, date, date)
@@ -0,0 +1,97 @@
+"""Brings a database created by an older version of the app up to date with the models.
+
+Base.metadata.create_all only creates tables that don't exist yet, it never alters
+one that does. upgrade_database adds the columns and indexes that have since been
+declared on the models to the existing tables, and fills in the new columns for the
+rows that are already there, so a deployed database doesn't need to be recreated.
+"""
+from sqlalchemy import inspect, select, update, func
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateColumn
+
+from database_models import Base, Booking, DailyRevenue, Film, Showing, rebuild_daily_revenue
+from database_models.booking import SEAT_COUNTERS
+
+
+def upgrade_database(engine):
+    """Adds any tables, columns and indexes declared on the models that are missing
+    from the database at engine, then backfills the columns that were added.
+
+    Safe to run more than once, if the database is already up to date nothing is
+    changed. Returns a list describing each change that was made."""
+    changes = []
+
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    Base.metadata.create_all(engine)  # Brand new tables, along with their indexes
+    changes += [f"created table {table}" for table in Base.metadata.tables if table not in existing_tables]
+
+    added_columns = set()
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+
+                definition = CreateColumn(column).compile(dialect=engine.dialect)
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {definition}")
+                added_columns.add((table.name, column.name))
+                changes.append(f"added column {table.name}.{column.name}")
+
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection)
+                    changes.append(f"created index {index.name}")
+
+        if any((Showing.__tablename__, sold) in added_columns for _, sold in SEAT_COUNTERS):
+            backfill_seat_counters(connection)
+            changes.append("filled in the seats sold for every showing")
+
+    # Importing database_models creates the table empty, so check for that rather than it existing
+    with engine.begin() as connection:
+        has_revenue = connection.execute(select(DailyRevenue.id).limit(1)).first() is not None
+        has_bookings = connection.execute(select(Booking.id).limit(1)).first() is not None
+        if has_bookings and not has_revenue:
+            rows = rebuild_daily_revenue(connection)
+            changes.append(f"filled in the daily revenue from the existing bookings ({rows} rows)")
+
+    filled = backfill_show_ends(engine)
+    if filled:
+        changes.append(f"filled in the end time of {filled} showings")
+
+    return changes
+
+
+def backfill_seat_counters(connection):
+    """Sets the seat counters of every showing to the total seats booked for it."""
+    showing = Showing.__table__
+    booking = Booking.__table__
+
+    connection.execute(update(showing).values({
+        sold: select(func.coalesce(func.sum(booking.c[booked]), 0))
+            .where(booking.c.showing_id == showing.c.id)
+            .scalar_subquery()
+        for booked, sold in SEAT_COUNTERS
+    }))
+
+
+def backfill_show_ends(engine):
+    """Sets the end time of every showing that doesn't have one, returning how many were set.
+
+    Done in python rather than sql, as databases store durations in different ways."""
+    with Session(engine) as session:
+        query = session.query(Showing.id, Showing.show_time, Film.duration).join(Showing.film)
+        mappings = [
+            {"id": showing_id, "show_end": show_time + duration}
+            for showing_id, show_time, duration in query.filter(Showing.show_end.is_(None))]
+
+        # Bulk updates skip the flush listeners, they would only set the same value again
+        session.bulk_update_mappings(Showing, mappings)
+        session.commit()
+
+        return len(mappings)
@@ -0,0 +1,94 @@
+from sqlalchemy import Column, Date, DateTime, Index, Integer, String, Text, event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import delete, or_
+
+from database_models import Base
+from database_models.cinema import Cinema
+from database_models.film import Film
+from database_models.user import User
+
+# The attributes of these that reports show, and the reports showing them, which are invalidated when one is renamed or deleted
+REPORTED_ATTRIBUTES = {
+    Film: (("title", "year_published"), ("BOOKINGS_PER_FILM", "TOP_REVENUE")),
+    Cinema: (("name",), ("MONTHLY_REVENUE", "TOP_REVENUE")),
+    User: (("username",), ("EMPLOYEE_BOOKINGS",)),
+}
+# Reports listing every film or cinema, even those without bookings, which are invalidated when one is added too
+LISTS_EVERY = {
+    Film: ("TOP_REVENUE",),
+    Cinema: ("MONTHLY_REVENUE",),
+}
+
+
+class ReportCache(Base):
+    """The result of a report that has already been run, so running it again with the same
+    parameters doesn't need to query the daily revenue.
+
+    Each report covers the dates date_from to date_to (inclusive, either of which is
+    None if the report isn't limited on that side). Whenever the daily revenue of a
+    date changes, as bookings are made, edited or cancelled or showings moved, the
+    reports covering that date are deleted (see the flush listener in daily_revenue.py).
+    Reports of months that are over are never invalidated unless their bookings are
+    changed, or a film, cinema or employee they list is renamed or deleted (see
+    invalidate_renamed at the bottom of this file).
+
+    A row with no result is a report that is being run. If it is invalidated before
+    the result is saved, the result is thrown away rather than saving a report that
+    is already out of date."""
+    __tablename__ = "report_cache"
+    __table_args__ = (
+        Index("ix_report_cache_key", "report_type", "parameters", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    report_type = Column(String, nullable=False)
+    parameters = Column(String, nullable=False)  # json, with the keys sorted so equal parameters match
+    date_from = Column(Date, nullable=True)
+    date_to = Column(Date, nullable=True)
+    result = Column(Text, nullable=True)  # json
+    created = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<ReportCache(report_type={self.report_type}, parameters={self.parameters}, created={self.created})>"
+
+
+def invalidate_report_cache(connection, date_from=None, date_to=None, report_types=None):
+    """Deletes the cached reports covering any date between date_from and date_to (inclusive),
+    or every cached report if neither is given. Only reports of the given report_types are
+    deleted, if any are given. Returns how many were deleted."""
+    table = ReportCache.__table__
+
+    overlapping = delete(table)
+    if report_types is not None:
+        overlapping = overlapping.where(table.c.report_type.in_(report_types))
+    if date_to is not None:
+        overlapping = overlapping.where(or_(table.c.date_from.is_(None), table.c.date_from <= date_to))
+    if date_from is not None:
+        overlapping = overlapping.where(or_(table.c.date_to.is_(None), table.c.date_to >= date_from))
+
+    return connection.execute(overlapping).rowcount
+
+
+@event.listens_for(Session, "after_flush")
+def invalidate_renamed(session, flush_context):
+    """Invalidates the cached reports listing a film, cinema or employee by name when it is
+    renamed or deleted, and those listing every film or cinema when one is added."""
+    report_types = set()
+
+    for obj in session.new:
+        report_types.update(LISTS_EVERY.get(type(obj), ()))
+
+    for obj in session.deleted:
+        if type(obj) in REPORTED_ATTRIBUTES:
+            report_types.update(REPORTED_ATTRIBUTES[type(obj)][1])
+
+    for obj in session.dirty:
+        if type(obj) not in REPORTED_ATTRIBUTES:
+            continue
+
+        attributes, reports = REPORTED_ATTRIBUTES[type(obj)]
+        if any(inspect(obj).attrs[attribute].history.has_changes() for attribute in attributes):
+            report_types.update(reports)
+
+    if report_types:
+        invalidate_report_cache(session.connection(), report_types=sorted(report_types))
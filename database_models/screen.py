@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import Column, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from database_models import Base
@@ -6,6 +6,9 @@ from database_models import Base
 
 class Screen(Base):
     __tablename__ = "screen"
+    __table_args__ = (
+        Index("ix_screen_cinema_id", "cinema_id"),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
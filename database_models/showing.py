@@ -1,13 +1,34 @@
-from sqlalchemy import Column, ForeignKey, Integer, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, ForeignKey, Index, Integer, DateTime, event, inspect
+from sqlalchemy.orm import relationship, Session
+from sqlalchemy.sql import and_
 
 from database_models import Base
+from database_models.film import Film
 
 
 class Showing(Base):
-    """A showing of a film. Number of booked seats can be tracked by
-    querying the related bookings."""
+    """A showing of a film.
+
+    The number of seats sold in each area is denormalised onto the
+    showing (lower_sold, upper_sold and vip_sold) so that availability
+    can be read without summing the related bookings. These counters
+    are kept in step with the bookings by a flush listener in
+    database_models/booking.py, so they should never be edited directly.
+
+    The end time of the showing is stored too (show_end), so schedule
+    queries can filter and sort by it in the database. It is set by the
+    flush listener at the bottom of this file whenever the start time or
+    film of a showing changes, or the duration of its film changes."""
     __tablename__ = "showing"
+    __table_args__ = (
+        # Schedules and clash checks for a screen
+        Index("ix_showing_screen_id_show_time", "screen_id", "show_time"),
+        Index("ix_showing_screen_id_show_end", "screen_id", "show_end"),
+        # Showings of a film, and the showings window filtered by film
+        Index("ix_showing_film_id_show_time", "film_id", "show_time"),
+        # Showings on a day or in a month, eg: the monthly reports
+        Index("ix_showing_show_time", "show_time"),
+    )
 
     id = Column(Integer, primary_key=True)
     screen_id = Column(Integer, ForeignKey("screen.id"))
@@ -15,6 +36,10 @@ class Showing(Base):
     # Only recording start time since pricing is based on that
     # e.g. starts at 11:00 at morning price, even though it ends in afternoon range
     show_time = Column(DateTime, nullable=False)
+    show_end = Column(DateTime)
+    lower_sold = Column(Integer, nullable=False, default=0, server_default="0")
+    upper_sold = Column(Integer, nullable=False, default=0, server_default="0")
+    vip_sold = Column(Integer, nullable=False, default=0, server_default="0")
 
     screen = relationship("Screen", back_populates="showings")
     film = relationship("Film", back_populates="showings")
@@ -23,6 +48,44 @@ class Showing(Base):
     def __repr__(self):
         return f"<Showing(id={self.id}, screen={self.screen}, film={self.film}, show_time={self.show_time})>"
 
-    @property
-    def show_end(self):
-        return self.show_time + self.film.duration
\ No newline at end of file
+    @classmethod
+    def overlapping(cls, start, end):
+        """SQL filter for showings that overlap the half open interval [start, end)."""
+        return and_(cls.show_time < end, cls.show_end > start)
+
+    def seats_remaining(self):
+        """Returns the number of unsold seats in the lower hall, upper gallery and vip area."""
+        return (
+            self.screen.lower_capacity - (self.lower_sold or 0),
+            self.screen.upper_capacity - (self.upper_sold or 0),
+            self.screen.vip_capacity - (self.vip_sold or 0))
+
+    def has_capacity(self, lower_booked, upper_booked, vip_booked):
+        """Checks if there are enough unsold seats left for a booking."""
+        lower_remaining, upper_remaining, vip_remaining = self.seats_remaining()
+
+        return lower_booked <= lower_remaining and\
+            upper_booked <= upper_remaining and\
+            vip_booked <= vip_remaining
+
+
+@event.listens_for(Session, "before_flush")
+def update_show_ends(session, flush_context, instances):
+    """Keeps the stored end time of showings in step with their start time and film."""
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Showing):
+            state = inspect(obj)
+            changed = any(state.attrs[attr].history.has_changes() for attr in ("show_time", "film", "film_id"))
+            if not (obj in session.new or changed):
+                continue
+
+            film = obj.film if obj.film is not None else session.get(Film, obj.film_id)
+            if film is not None and obj.show_time is not None:
+                obj.show_end = obj.show_time + film.duration
+
+        elif isinstance(obj, Film) and inspect(obj).persistent:
+            if not inspect(obj).attrs.duration.history.has_changes():
+                continue
+
+            for showing in obj.showings:
+                showing.show_end = showing.show_time + obj.duration
@@ -0,0 +1,100 @@
+import sys
+import time
+from argparse import ArgumentParser
+from datetime import date, datetime
+
+from database_models import session_scope, Cinema
+from services import run_report, EXPORT_FORMATS, MONTHLY_REPORTS, REPORT_TYPES
+
+
+def year_month(text):
+    """Parses a month given as YYYY-MM, returning (month, year)."""
+    parsed = datetime.strptime(text, "%Y-%m")
+    return parsed.month, parsed.year
+
+
+def find_cinema_id(cinema):
+    """Returns the id of a cinema given by its id or name, or None if there isn't one."""
+    with session_scope() as session:
+        query = session.query(Cinema.id)
+        query = query.filter(Cinema.id == int(cinema)) if cinema.isdigit() else query.filter(Cinema.name == cinema)
+        found = query.first()
+
+    return found[0] if found else None
+
+
+def export_format(args):
+    """The format to export in, from --format or else the extension of --output (csv if neither)."""
+    if args.format:
+        return args.format
+
+    for name, (_, _, extensions) in EXPORT_FORMATS.items():
+        if args.output and args.output.lower().endswith(extensions):
+            return name
+
+    return "csv"
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        description="Runs a report without opening the application, writing its rows as csv, json lines or a pdf.",
+        epilog="Report types: " + "; ".join(f"{name} - {description}" for name, description in REPORT_TYPES.items()))
+    parser.add_argument("report_type", type=str.upper, choices=list(REPORT_TYPES), metavar="report_type")
+    parser.add_argument("--month", type=year_month, help="month to report on, eg: 2022-11 (needed by monthly reports)")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="first date of showings to include, eg: 2022-11-01")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="last date of showings to include")
+    parser.add_argument("--cinema", help="id or name of the only cinema to include")
+    parser.add_argument("--top", dest="top_n", type=int, default=1, help="number of films to list (default 1)")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), help="defaults to the extension of --output, or csv")
+    parser.add_argument("--output", "-o", help="file to write to, instead of stdout")
+    parser.add_argument("--no-cache", dest="use_cache", action="store_false", help="run the report even if it is cached")
+    parser.add_argument("--time", action="store_true", help="print how long the report took to stderr")
+    args = parser.parse_args()
+
+    # The month is only used by monthly reports, the rest of the options only by the top revenue report
+    if args.report_type in MONTHLY_REPORTS and args.month is None:
+        parser.error(f"{args.report_type} needs a --month")
+    if args.report_type not in MONTHLY_REPORTS and args.month is not None:
+        parser.error(f"{args.report_type} isn't run for a month, only {' and '.join(MONTHLY_REPORTS)} take --month")
+    if args.report_type != "TOP_REVENUE" and (args.date_from or args.date_to or args.cinema or args.top_n != 1):
+        parser.error("--from, --to, --cinema and --top can only be used with TOP_REVENUE")
+    if args.date_from and args.date_to and args.date_from > args.date_to:
+        parser.error("--from must be on or before --to")
+    if args.top_n < 1:
+        parser.error("--top must be at least 1")
+
+    cinema_id = None
+    if args.cinema is not None:
+        cinema_id = find_cinema_id(args.cinema)
+        if cinema_id is None:
+            parser.error(f"There is no cinema '{args.cinema}'")
+
+    month, year = args.month or (None, None)
+
+    start = time.perf_counter()
+    try:
+        report = run_report(
+            args.report_type, month=month, year=year, top_n=args.top_n, date_from=args.date_from,
+            date_to=args.date_to, cinema_id=cinema_id, use_cache=args.use_cache)
+    except ValueError as e:
+        parser.exit(1, f"{e}\n")
+    report_ms = (time.perf_counter() - start) * 1000
+
+    writer, binary, _ = EXPORT_FORMATS[export_format(args)]
+    if args.output:
+        file = open(args.output, "wb") if binary else open(args.output, "w", newline="", encoding="utf-8")
+    else:
+        # Written straight to stdout's file descriptor, so csv line endings and pdf bytes are left as they are
+        sys.stdout.flush()
+        file = open(sys.stdout.fileno(), "wb" if binary else "w", newline=None if binary else "",
+                    encoding=None if binary else "utf-8", closefd=False)
+
+    start = time.perf_counter()
+    with file:
+        rows = writer(report, file)
+    write_ms = (time.perf_counter() - start) * 1000
+
+    if args.time:
+        print(
+            f"{report.title}: ran in {report_ms:.1f}ms, wrote {rows} rows in {write_ms:.1f}ms",
+            file=sys.stderr)
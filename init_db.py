@@ -1,6 +1,8 @@
 from datetime import datetime, timedelta
 
 from database_models import session, User, Cinema, City, Authority, Screen, Film, AgeRatings, Genre, Showing, Booking
+from misc.constants import PLACEHOLDER_POSTER
+from misc.thumbnails import generate_thumbnails
 
 if __name__ == "__main__":
     cities = {
@@ -102,4 +104,8 @@ if __name__ == "__main__":
     for row in list(cities.values()) + cinemas + users + screens + films + genres + showings:
         session.add(row)
 
-    session.commit()
\ No newline at end of file
+    session.commit()
+
+    # Resize the posters now, so the first page of films doesn't have to
+    for poster in [PLACEHOLDER_POSTER] + [film.poster for film in films if film.poster]:
+        generate_thumbnails(poster)
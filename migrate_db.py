@@ -0,0 +1,11 @@
+from database_models import engine
+from database_models.migrations import upgrade_database
+
+if __name__ == "__main__":
+    changes = upgrade_database(engine)
+
+    if not changes:
+        print("The database is already up to date")
+
+    for change in changes:
+        print(change)
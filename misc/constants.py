@@ -10,4 +10,23 @@ EDIT = "Edit"
 MIDNIGHT = time(hour=0, minute=0)
 EIGHT_AM = time(hour=8, minute=0)
 
-FILM_FORMAT = "{0.title} ({0.year_published})"
\ No newline at end of file
+FILM_FORMAT = "{0.title} ({0.year_published})"
+NOON = time(hour=12, minute=0)
+FIVE_PM = time(hour=17, minute=0)
+
+# Pricing time bands, a showing is priced by the band it starts in
+MORNING = "morning"
+AFTERNOON = "afternoon"
+EVENING = "evening"
+
+# Upper gallery seats cost 20% more than lower hall seats,
+# vip seats cost a further 20% more than upper gallery seats
+UPPER_MULTIPLIER = 1.2
+VIP_MULTIPLIER = 1.2
+
+PLACEHOLDER_POSTER = "assets/placeholder.png"
+POSTER_SIZE = (200, 200)
+
+# Resized copies of posters are kept here, named after a hash of the poster's contents
+THUMBNAIL_DIRECTORY = "assets/thumbnails"
+THUMBNAIL_SIZES = (POSTER_SIZE,)
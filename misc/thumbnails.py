@@ -0,0 +1,113 @@
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+
+from PIL import Image
+
+from misc.constants import THUMBNAIL_DIRECTORY, THUMBNAIL_SIZES
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# (path, modified time, file size): hash of the file's contents,
+# so unchanged posters aren't read again just to find their thumbnails
+_content_hashes = {}
+
+
+def content_hash(path):
+    """Gets the sha256 hash of the contents of the file at path."""
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+
+    if key not in _content_hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as image_file:
+            while chunk := image_file.read(HASH_CHUNK_SIZE):
+                digest.update(chunk)
+        _content_hashes[key] = digest.hexdigest()
+
+    return _content_hashes[key]
+
+
+def thumbnail_path(path, size):
+    width, height = size
+    return os.path.join(THUMBNAIL_DIRECTORY, f"{content_hash(path)}_{width}x{height}.png")
+
+
+def generate_thumbnails(path, sizes=THUMBNAIL_SIZES):
+    """Saves a resized copy of the image at path for each of sizes, if there isn't one already.
+
+    The full size image is only decoded if a thumbnail is missing. Call this when a
+    poster is added so its thumbnails are ready before it is first displayed."""
+    missing = [size for size in sizes if not os.path.exists(thumbnail_path(path, size))]
+    if not missing:
+        return
+
+    os.makedirs(THUMBNAIL_DIRECTORY, exist_ok=True)
+    with Image.open(path) as image:
+        for size in missing:
+            destination = thumbnail_path(path, size)
+
+            # Written to a temporary file first, so a half written thumbnail is never read
+            temporary = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+            image.resize(size).save(temporary, format="PNG")
+            os.replace(temporary, destination)
+
+
+def load_thumbnail(path, size):
+    """Opens the thumbnail of the image at path, generating it first if needed.
+
+    Returns a PIL image, so this can be called away from the Tk thread."""
+    destination = thumbnail_path(path, size)
+    if not os.path.exists(destination):
+        generate_thumbnails(path, [size])
+
+    with Image.open(destination) as thumbnail:
+        thumbnail.load()
+        return thumbnail
+
+
+def file_version(path):
+    """Changes whenever the file at path is replaced or edited, without reading it."""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class ThumbnailCache:
+    """Keeps the PhotoImages of the most recently displayed thumbnails, so
+    paging back and forth doesn't read them from disk again.
+
+    Images are keyed by path and size, along with the file's modified time and
+    size so an edited file is loaded again. Once max_images are held the least
+    recently used is dropped. Widgets displaying a dropped image keep their own
+    reference, so it stays on screen."""
+    def __init__(self, max_images=64):
+        self.max_images = max_images
+        self.images = OrderedDict()
+
+    @staticmethod
+    def key(path, size):
+        return (path, file_version(path), size)
+
+    def lookup(self, key):
+        """Gets a cached PhotoImage, or None if it isn't cached."""
+        if key not in self.images:
+            return None
+
+        self.images.move_to_end(key)
+        return self.images[key]
+
+    def put(self, key, photo_image):
+        self.images[key] = photo_image
+        if len(self.images) > self.max_images:
+            self.images.popitem(last=False)
+
+        return photo_image
+
+    def discard(self, key, photo_image):
+        """Removes photo_image from the cache, if it is still the image cached under key."""
+        if self.images.get(key) is photo_image:
+            del self.images[key]
+
+
+poster_thumbnails = ThumbnailCache()
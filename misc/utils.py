@@ -1,5 +1,28 @@
+from datetime import time
+
+from misc.constants import EIGHT_AM, NOON, FIVE_PM, MORNING, AFTERNOON, EVENING
+
+
 def get_hours_minutes(total_seconds):
     """Gets the hours and minutes from a duration in seconds."""
     m, s = divmod(total_seconds, 60)
     h, m = divmod(m, 60)
-    return int(h), int(m)
\ No newline at end of file
+    return int(h), int(m)
+
+
+def get_time_band(show_time):
+    """Gets the pricing time band (MORNING, AFTERNOON or EVENING) that a
+    showing starting at show_time falls into."""
+    start = time(hour=show_time.hour, minute=show_time.minute)
+
+    if EIGHT_AM <= start < NOON:
+        # Starts between 8am-11:59am
+        return MORNING
+    if NOON <= start < FIVE_PM:
+        # Starts between 12pm-4:59pm
+        return AFTERNOON
+    if FIVE_PM <= start:
+        # Starts between 5pm-12am
+        return EVENING
+
+    raise ValueError(f"A showing starting at {start.strftime('%H:%M')} is outside of opening hours")
@@ -0,0 +1,15 @@
+from argparse import ArgumentParser
+from datetime import date
+
+from database_models import engine, rebuild_daily_revenue
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Recalculates the daily revenue the reports are run from, using the bookings.")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="first date to rebuild, eg: 2022-11-01")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="last date to rebuild")
+    args = parser.parse_args()
+
+    with engine.begin() as connection:
+        rows = rebuild_daily_revenue(connection, args.date_from, args.date_to)
+
+    print(f"Rebuilt {rows} rows of daily revenue")
@@ -0,0 +1,9 @@
+from services.booking import book_seats, quote_booking, get_booking, cancel_booking, SoldOutError
+from services.showings import (
+    get_show_times, list_showings, showing_sort_key, schedule_showing, schedule_recurring_showings,
+    ScreenSchedule, ScheduledShowing, SchedulingConflict, ShowTime, ShowingConflictError)
+from services.showing_index import ShowingIndex, showing_changes
+from services.films import list_films, list_films_showing, film_sort_key, FilmPage, FILMS_PER_PAGE
+from services.reports import run_report, get_month_start_end, Report, REPORT_TYPES, MONTHLY_REPORTS
+from services.report_pdf import ReportPDF, render_report
+from services.report_export import write_csv, write_json_lines, write_pdf, EXPORT_FORMATS
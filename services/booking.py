@@ -0,0 +1,121 @@
+import random
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import joinedload
+
+from database_models import session_factory, session_scope, Booking, PriceLookup, Screen, Showing
+
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 0.05  # seconds, doubled after every failed attempt
+
+
+class SoldOutError(ValueError):
+    """Raised when a showing does not have enough unsold seats left for a booking."""
+
+
+def book_seats(showing_id, employee_id, lower_booked, upper_booked, vip_booked, name, phone, email, on_retry=None):
+    """Creates a booking, reserving its seats atomically.
+
+    The showing's seat counters are incremented in the database ('x = x + n')
+    as part of the same transaction that inserts the booking. That update holds
+    the showing's row lock (or sqlite's write lock) until commit, so re-reading
+    the counters afterwards shows every booking committed before ours plus our
+    own. If that goes over the screen's capacity the transaction is rolled back
+    and SoldOutError is raised, so two terminals can never sell the same seat.
+
+    Lock timeouts, deadlocks and serialization failures are retried with
+    backoff up to MAX_ATTEMPTS times before the error is re-raised. If
+    on_retry is provided it is called with the error before each retry.
+
+    Returns the new booking, detached from the session that created it."""
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        session = session_factory()
+        try:
+            booking = Booking(
+                showing_id=showing_id,
+                employee_id=employee_id,
+                lower_booked=lower_booked,
+                upper_booked=upper_booked,
+                vip_booked=vip_booked,
+                name=name,
+                phone=phone,
+                email=email)
+            session.add(booking)
+            session.flush()  # Increments the seat counters, taking the lock
+
+            remaining = session.query(
+                Screen.lower_capacity - Showing.lower_sold,
+                Screen.upper_capacity - Showing.upper_sold,
+                Screen.vip_capacity - Showing.vip_sold
+            ).join(Showing.screen).filter(Showing.id == showing_id).first()
+
+            if remaining is None:
+                session.rollback()
+                raise ValueError("That showing no longer exists")
+
+            if any(seats < 0 for seats in remaining):
+                session.rollback()
+                lower_remaining, upper_remaining, vip_remaining = (
+                    seats + booked for seats, booked in zip(remaining, (lower_booked, upper_booked, vip_booked)))
+                raise SoldOutError(
+                    "There are not enough seats left for this booking. Remaining seats: "
+                    f"{lower_remaining} Lower Hall, {upper_remaining} Upper Gallery, {vip_remaining} VIP")
+
+            session.commit()
+            return booking
+        except OperationalError as e:
+            # Database locked, deadlock or serialization failure, try again from the start
+            session.rollback()
+            if attempt == MAX_ATTEMPTS:
+                raise
+            if on_retry:
+                on_retry(e)
+            time.sleep(RETRY_DELAY * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        finally:
+            session.close()
+
+
+def quote_booking(showing_id, lower_booked, upper_booked, vip_booked):
+    """Gets the price of a booking without making it."""
+    with session_scope() as session:
+        lookup = PriceLookup(session, [showing_id])
+
+        try:
+            base_price = lookup[showing_id]
+        except KeyError:
+            raise ValueError("That showing no longer exists")
+
+        return Booking.price_from_base(base_price, lower_booked, upper_booked, vip_booked)
+
+
+def get_booking(booking_id):
+    """Gets a booking by its reference, along with the showing and film it is for.
+
+    Raises ValueError if there is no booking with that reference."""
+    try:
+        booking_id = int(booking_id)
+    except ValueError:
+        raise ValueError(f"The booking #{booking_id} does not exist")
+
+    with session_scope() as session:
+        booking = session.query(Booking).options(
+            joinedload(Booking.showing).joinedload(Showing.film)
+        ).filter(Booking.id == booking_id).first()
+
+        if not booking:
+            raise ValueError(f"The booking #{booking_id} does not exist")
+
+        return booking
+
+
+def cancel_booking(booking_id):
+    """Cancels a booking, releasing its seats.
+
+    Raises ValueError if there is no booking with that reference."""
+    with session_scope() as session:
+        booking = session.get(Booking, booking_id)
+        if not booking:
+            raise ValueError(f"The booking #{booking_id} does not exist")
+
+        session.delete(booking)
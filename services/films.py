@@ -0,0 +1,60 @@
+from collections import namedtuple
+from datetime import datetime, time
+from math import ceil
+
+from sqlalchemy import distinct, func, select
+from sqlalchemy.orm import selectinload
+
+from database_models import session_scope, Film, Screen, Showing
+from services.paging import keyset_page
+
+FILMS_PER_PAGE = 4
+
+FilmPage = namedtuple("FilmPage", ["films", "page", "page_count", "total"])
+
+
+def list_films(after=None, before=None, limit=None):
+    """Lists films sorted by title, with the columns shown when listing them.
+
+    Films can be fetched a page at a time by passing the film_sort_key of the row
+    to page after or before, and a limit."""
+    with session_scope() as session:
+        query = session.query(
+            Film.id, Film.title, Film.year_published, Film.age_rating, Film.duration, Film.rating)
+
+        return keyset_page(query, [Film.title, Film.id], after=after, before=before, limit=limit)
+
+
+def film_sort_key(row):
+    """The key list_films sorts and pages its rows by."""
+    return (row.title, row.id)
+
+
+def list_films_showing(cinema_id, date, page=1, per_page=FILMS_PER_PAGE):
+    """Lists one page of the films with a showing at a cinema on date, sorted by title.
+
+    Each film is only listed once however many showings it has. The films come
+    with their genres already loaded, so the page takes the same three small
+    queries (count, films, genres) however many films are on the schedule.
+
+    Returns a FilmPage, page numbers start at 1."""
+    day_beginning = datetime.combine(date, time(hour=0, minute=0))
+    day_end = datetime.combine(date, time(hour=23, minute=59))
+
+    with session_scope() as session:
+        showing_films = select(Showing.film_id).join(Showing.screen).where(
+            Screen.cinema_id == cinema_id,
+            Showing.show_time >= day_beginning,
+            Showing.show_time <= day_end)
+
+        total = session.scalar(showing_films.with_only_columns(func.count(distinct(Showing.film_id))))
+        page_count = max(1, ceil(total / per_page))
+        page = min(max(1, page), page_count)
+
+        films = []
+        if total:
+            query = session.query(Film).options(selectinload(Film.genres))
+            query = query.filter(Film.id.in_(showing_films)).order_by(Film.title, Film.id)
+            films = query.limit(per_page).offset((page - 1) * per_page).all()
+
+        return FilmPage(films, page, page_count, total)
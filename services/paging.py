@@ -0,0 +1,40 @@
+from sqlalchemy import bindparam, tuple_
+
+PAGE_SIZE = 100
+
+
+def keyset_page(query, order_columns, after=None, before=None, limit=None):
+    """Orders query by order_columns and limits it to one page of rows.
+
+    Rows are paged by their sort key (the values of order_columns) rather than an
+    offset, so fetching a page deep into a large result set is as quick as the first.
+    If after is provided the page is the rows following that key, if before is provided
+    it is the rows preceding it. Rows are always returned in ascending order.
+
+    The last of order_columns must be unique (eg: the primary key) so keys never tie."""
+    def key_values(key):
+        return tuple_(*(
+            bindparam(None, value, type_=column.type)
+            for column, value in zip(order_columns, key)))
+
+    backwards = after is None and before is not None
+
+    if after is not None:
+        query = query.filter(tuple_(*order_columns) > key_values(after))
+    elif backwards:
+        query = query.filter(tuple_(*order_columns) < key_values(before))
+
+    if backwards:
+        # Walk backwards from the key, then flip the page back round
+        query = query.order_by(*(column.desc() for column in order_columns))
+    else:
+        query = query.order_by(*order_columns)
+
+    if limit is not None:
+        query = query.limit(limit)
+
+    rows = query.all()
+    if backwards:
+        rows.reverse()
+
+    return rows
@@ -0,0 +1,46 @@
+import csv
+import json
+
+from services.report_pdf import render_report
+
+
+def write_csv(report, file):
+    """Writes a report to a text file as csv, with the field names as the first row.
+
+    Returns the number of rows written."""
+    writer = csv.writer(file)
+    writer.writerow(report.field_names)
+
+    count = 0
+    for row in report.rows:
+        writer.writerow(row)
+        count += 1
+
+    return count
+
+
+def write_json_lines(report, file):
+    """Writes a report to a text file as json lines, each row an object keyed by the field names.
+
+    Returns the number of rows written."""
+    count = 0
+    for row in report.rows:
+        file.write(json.dumps(dict(zip(report.field_names, row))) + "\n")
+        count += 1
+
+    return count
+
+
+def write_pdf(report, file):
+    """Writes a report to a binary file as a pdf table, returning the number of rows written."""
+    pdf = render_report(report)
+    file.write(pdf.output())
+    return len(report.rows)
+
+
+# format name: (writer, whether it writes bytes rather than text, file extensions of that format)
+EXPORT_FORMATS = {
+    "csv": (write_csv, False, (".csv",)),
+    "jsonl": (write_json_lines, False, (".jsonl", ".ndjson")),
+    "pdf": (write_pdf, True, (".pdf",)),
+}
@@ -0,0 +1,139 @@
+from itertools import chain, islice
+
+from fpdf import FPDF
+
+# How values in a column are shown, by field name, any others are shown with str
+FORMATTERS = {
+    "Total Revenue": lambda value: f"£{value:.2f}",
+}
+
+
+class ReportPDF(FPDF):
+    """A report written to a PDF as a table, one row at a time.
+
+    Rows can come from any iterable, eg: a generator reading them from the
+    database, and are written as they are read rather than being built up into
+    one string first. The column headings are repeated at the top of every page
+    and rows are never split across pages.
+
+    Column widths are worked out from the headings and the first SAMPLE_ROWS
+    rows, any later cells that don't fit are cut short with an ellipsis."""
+    SAMPLE_ROWS = 200
+    ROW_HEIGHT = 6  # mm
+    MIN_COLUMN_WIDTH = 15  # mm
+    CELL_PADDING = 2  # mm, around the text in each cell
+    PROGRESS_ROWS = 100  # How often write_rows reports its progress
+
+    def __init__(self, title, field_names=None, formatters=None):
+        super().__init__()
+        self.report_title = title
+        self.field_names = field_names or []
+        self.formatters = FORMATTERS if formatters is None else formatters
+        self.column_widths = []
+        self.numeric_columns = set()
+        self.widest_character = 0
+
+        self.set_title(title)
+        # Replaced with the number of pages, long enough for the thousands of pages of the biggest reports
+        self.alias_nb_pages("{total_pages}")
+        self.set_auto_page_break(True, margin=15)
+
+    def header(self):
+        if self.page_no() == 1:
+            self.set_font("helvetica", "B", 16)
+            self.multi_cell(0, 10, self.report_title, new_x="LMARGIN", new_y="NEXT")
+            self.ln(2)
+
+        if self.column_widths:
+            self.set_font("helvetica", "B", 10)
+            self.set_fill_color(220, 220, 220)
+            for i, (name, width) in enumerate(zip(self.field_names, self.column_widths)):
+                self.cell(width, self.ROW_HEIGHT, self.fit_text(name, width), border=1, fill=True,
+                          align="R" if i in self.numeric_columns else "L")
+            self.ln(self.ROW_HEIGHT)
+
+        self.set_font("helvetica", "", 10)
+
+    def footer(self):
+        self.set_y(-12)
+        self.set_font("helvetica", "", 8)
+        self.cell(0, 5, f"Page {self.page_no()}/{{total_pages}}", align="C")
+
+    def format_row(self, row):
+        return [
+            self.formatters.get(name, str)(value) if value is not None else ""
+            for name, value in zip(self.field_names, row)]
+
+    def fit_columns(self, sample):
+        """Shares the page width between the columns, in proportion to the widest text in each."""
+        self.set_font("helvetica", "", 10)
+        self.widest_character = self.get_string_width("@")
+        widest = [self.get_string_width(name) for name in self.field_names]
+        for row in sample:
+            for i, text in enumerate(self.format_row(row)):
+                widest[i] = max(widest[i], self.get_string_width(text))
+
+        wanted = [max(width + 2 * self.CELL_PADDING, self.MIN_COLUMN_WIDTH) for width in widest]
+        scale = min(1, self.epw / sum(wanted))
+        self.column_widths = [width * scale for width in wanted]
+
+        self.numeric_columns = {
+            i for i in range(len(self.field_names))
+            if sample and all(isinstance(row[i], (int, float)) for row in sample if row[i] is not None)}
+
+    def fit_text(self, text, width):
+        """Cuts text short with an ellipsis so it fits in a cell width wide."""
+        available = width - 2 * self.CELL_PADDING
+        # Measuring every cell is slow, most are short enough to fit whatever their characters
+        if len(text) * self.widest_character <= available or self.get_string_width(text) <= available:
+            return text
+
+        while text and self.get_string_width(text + "...") > available:
+            text = text[:-1]
+        return text + "..."
+
+    def write_rows(self, rows, progress=None, total=None):
+        """Writes every row as a table, starting a new page whenever the current one is full.
+
+        If progress is given, it is called with (rows written, total, stage) every
+        PROGRESS_ROWS rows, total being the number of rows if it is known.
+        Returns the number of rows written."""
+        rows = iter(rows)
+        sample = list(islice(rows, self.SAMPLE_ROWS))
+        self.fit_columns(sample)
+        self.add_page()
+
+        count = 0
+        for row in chain(sample, rows):
+            if progress is not None and count % self.PROGRESS_ROWS == 0:
+                progress(count, total, "Writing rows")
+
+            if self.will_page_break(self.ROW_HEIGHT):
+                self.add_page()  # Repeats the headings
+
+            for i, (text, width) in enumerate(zip(self.format_row(row), self.column_widths)):
+                self.cell(width, self.ROW_HEIGHT, self.fit_text(text, width), border=1,
+                          align="R" if i in self.numeric_columns else "L")
+            self.ln(self.ROW_HEIGHT)
+            count += 1
+
+        return count
+
+    def write_text(self, text):
+        """Writes a paragraph, for reports that are a sentence rather than a table."""
+        if self.page == 0:
+            self.add_page()
+
+        self.multi_cell(0, self.ROW_HEIGHT, text, new_x="LMARGIN", new_y="NEXT")
+
+
+def render_report(report, rows=None, formatters=None, progress=None):
+    """Renders a Report as a ReportPDF table, rows are read from report.rows unless given.
+
+    progress is passed on to ReportPDF.write_rows."""
+    rows = report.rows if rows is None else rows
+    total = len(rows) if hasattr(rows, "__len__") else None
+
+    pdf = ReportPDF(report.title, report.field_names, formatters)
+    pdf.write_rows(rows, progress, total)
+    return pdf
@@ -0,0 +1,255 @@
+import json
+from calendar import monthrange
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy.sql import func, desc, and_, delete, insert, select, update
+
+from database_models import session_scope, Film, Cinema, DailyRevenue, ReportCache, User
+from misc.constants import FILM_FORMAT
+
+REPORT_TYPES = {
+    "BOOKINGS_PER_FILM": "Total number of bookings per film",
+    "MONTHLY_REVENUE": "Total monthly revenue for each cinema",
+    "TOP_REVENUE": "Top revenue generating film",
+    "EMPLOYEE_BOOKINGS": "Monthly total of bookings each employee has made"
+}
+
+# Reports that need a month and year to be run
+MONTHLY_REPORTS = ("MONTHLY_REVENUE", "EMPLOYEE_BOOKINGS")
+
+Report = namedtuple("Report", ["title", "field_names", "rows", "default_filename"])
+
+
+def get_month_start_end(month, year):
+    month_start = datetime(year=year, month=month, day=1)
+    _, month_length = monthrange(year, month)
+    month_end = datetime(year=year, month=month, day=month_length, hour=23, minute=59, second=59)
+
+    return month_start, month_end
+
+
+def run_report(
+        report_type, month=None, year=None, top_n=1, date_from=None, date_to=None, cinema_id=None, use_cache=True):
+    """Runs one of the REPORT_TYPES, returning its rows as a Report.
+
+    Reports in MONTHLY_REPORTS also need the month and year to report on. The
+    TOP_REVENUE report lists the top_n films, and can be limited to showings
+    between the dates date_from and date_to (inclusive) and at one cinema.
+
+    Every report is run from the DailyRevenue totals rather than the bookings,
+    so they take about as long however many years of bookings there are. The
+    result is kept in the ReportCache, and returned from there the next time
+    the report is run with the same parameters, unless use_cache is False."""
+    if report_type not in REPORT_TYPES:
+        raise ValueError(f"There is no report type '{report_type}'")
+
+    if report_type in MONTHLY_REPORTS and (month is None or year is None):
+        raise ValueError(f"The report '{REPORT_TYPES[report_type]}' needs a month and year")
+
+    # The parameters the report depends on, and the dates it covers
+    if report_type in MONTHLY_REPORTS:
+        month_start, month_end = get_month_start_end(month, year)
+        parameters = {"month": month, "year": year}
+        covered = (month_start.date(), month_end.date())
+    elif report_type == "TOP_REVENUE":
+        parameters = {"top_n": top_n, "date_from": date_from, "date_to": date_to, "cinema_id": cinema_id}
+        covered = (date_from, date_to)
+    else:
+        parameters = {}
+        covered = (None, None)
+
+    def run(session):
+        if report_type == "BOOKINGS_PER_FILM":
+            return bookings_per_film_report(session)
+        if report_type == "MONTHLY_REVENUE":
+            return monthly_revenue_report(session, month, year)
+        if report_type == "TOP_REVENUE":
+            return top_revenue_report(session, top_n, date_from, date_to, cinema_id)
+        if report_type == "EMPLOYEE_BOOKINGS":
+            return employee_bookings_report(session, month, year)
+
+    if not use_cache:
+        with session_scope() as session:
+            return run(session)
+
+    return cached_report(report_type, parameters, *covered, run)
+
+
+def cached_report(report_type, parameters, date_from, date_to, run):
+    """Returns the cached result of a report, or runs it with run(session) and caches that.
+
+    The report covers the dates date_from to date_to (either None if it isn't limited on
+    that side), it is invalidated when the daily revenue of any of them changes."""
+    table = ReportCache.__table__
+    parameters = json.dumps(parameters, sort_keys=True, default=str)
+    matching = and_(table.c.report_type == report_type, table.c.parameters == parameters)
+
+    with session_scope() as session:
+        result = session.execute(select(table.c.result).where(matching)).scalar()
+        if result is not None:
+            return Report(**json.loads(result))
+
+        # Committed before the report is run, so a booking made while it runs deletes this row
+        session.execute(delete(table).where(matching))
+        pending_id = session.execute(insert(table).values(
+            report_type=report_type, parameters=parameters, date_from=date_from, date_to=date_to,
+            result=None, created=datetime.now())).inserted_primary_key[0]
+
+    try:
+        with session_scope() as session:
+            report = run(session)
+    except Exception:
+        with session_scope() as session:
+            session.execute(delete(table).where(table.c.id == pending_id))
+        raise
+
+    with session_scope() as session:
+        # Does nothing if the report was invalidated while it was running
+        session.execute(update(table).where(table.c.id == pending_id).values(result=json.dumps(report._asdict())))
+
+    return report
+
+
+def bookings_per_film_report(session):
+    """The equivalent sql for this sqlalchemy query:
+
+    SELECT
+        *,
+        SUM(daily_revenue.lower_booked) AS `lb`,
+        SUM(daily_revenue.upper_booked) AS `ub`,
+        SUM(daily_revenue.vip_booked) AS `vb`,
+        (`lb` + `ub` + `vb`) AS `total_b`
+    FROM film
+    INNER JOIN daily_revenue ON film.id = daily_revenue.film_id
+    GROUP BY film.id
+    ORDER BY DESC `total_b`"""
+    lower = func.sum(DailyRevenue.lower_booked)
+    upper = func.sum(DailyRevenue.upper_booked)
+    vip = func.sum(DailyRevenue.vip_booked)
+
+    query = session.query(Film, lower, upper, vip, (lower + upper + vip).label("total_b"))
+    query = query.join(DailyRevenue, DailyRevenue.film_id == Film.id).group_by(Film.id)
+    query = query.order_by(desc("total_b"), Film.id)
+
+    return Report(
+        title=REPORT_TYPES["BOOKINGS_PER_FILM"],
+        field_names=["Film", "Lower Hall", "Upper Gallery", "VIP", "Total"],
+        rows=[[FILM_FORMAT.format(film), *booking_values] for film, *booking_values in query.all()],
+        default_filename="bookings per film")
+
+
+def monthly_revenue_report(session, month, year):
+    """Equivalent sql for this query is:
+
+    SELECT cinema.name, COALESCE(revenue.total, 0)
+    FROM cinema
+    LEFT OUTER JOIN (
+        SELECT daily_revenue.cinema_id, SUM(daily_revenue.revenue_pence) AS total
+        FROM daily_revenue
+        WHERE
+            daily_revenue.date >= {month_start} AND
+            daily_revenue.date <= {month_end}
+        GROUP BY daily_revenue.cinema_id
+    ) AS revenue ON revenue.cinema_id = cinema.id
+    ORDER BY DESC COALESCE(revenue.total, 0), cinema.id
+
+    Cinemas without any bookings that month are included with no revenue."""
+    month_start, month_end = get_month_start_end(month, year)
+
+    revenue = session.query(DailyRevenue.cinema_id, func.sum(DailyRevenue.revenue_pence).label("total"))
+    revenue = revenue.filter(and_(
+        DailyRevenue.date >= month_start.date(),
+        DailyRevenue.date <= month_end.date()))
+    revenue = revenue.group_by(DailyRevenue.cinema_id).subquery()
+
+    total = func.coalesce(revenue.c.total, 0)
+    query = session.query(Cinema.name, total).outerjoin(revenue, revenue.c.cinema_id == Cinema.id)
+    query = query.order_by(desc(total), Cinema.id)
+
+    return Report(
+        title=f"Total revenue for {month_start.strftime('%B %Y')}",
+        field_names=["Cinema", "Total Revenue"],
+        rows=[[name, pence / 100] for name, pence in query],
+        default_filename=f"cinema revenue {month_start.strftime('%B %Y')}")
+
+
+def top_revenue_report(session, top_n=1, date_from=None, date_to=None, cinema_id=None):
+    """Summed and ranked by the database, so only the top_n films are loaded. Equivalent to:
+
+    SELECT film.*, COALESCE(revenue.total, 0) AS `film_revenue`
+    FROM film
+    LEFT OUTER JOIN (
+        SELECT daily_revenue.film_id, SUM(daily_revenue.revenue_pence) AS total
+        FROM daily_revenue
+        WHERE {optional date range and cinema}
+        GROUP BY daily_revenue.film_id
+    ) AS revenue ON revenue.film_id = film.id
+    ORDER BY `film_revenue` DESC, film.id
+    LIMIT {top_n}
+
+    Films that made nothing are included, so there are always top_n rows if there are that many films."""
+    revenue = session.query(DailyRevenue.film_id, func.sum(DailyRevenue.revenue_pence).label("total"))
+
+    if date_from is not None:
+        revenue = revenue.filter(DailyRevenue.date >= date_from)
+    if date_to is not None:
+        revenue = revenue.filter(DailyRevenue.date <= date_to)
+    if cinema_id is not None:
+        revenue = revenue.filter(DailyRevenue.cinema_id == cinema_id)
+
+    revenue = revenue.group_by(DailyRevenue.film_id).subquery()
+
+    film_revenue = func.coalesce(revenue.c.total, 0).label("film_revenue")
+    query = session.query(Film, film_revenue).outerjoin(revenue, revenue.c.film_id == Film.id)
+    query = query.order_by(desc("film_revenue"), Film.id).limit(top_n)
+
+    title = REPORT_TYPES["TOP_REVENUE"] if top_n == 1 else f"Top {top_n} revenue generating films"
+    filename = "top revenue film" if top_n == 1 else f"top {top_n} revenue films"
+    if cinema_id is not None:
+        cinema = session.query(Cinema).get(cinema_id)
+        if cinema is None:
+            raise ValueError(f"There is no cinema with the id {cinema_id}")
+        title += f" at {cinema.name}"
+        filename += f" {cinema.name}"
+    if date_from is not None or date_to is not None:
+        period = " ".join([
+            f"from {date_from.strftime('%d %B %Y')}" if date_from is not None else "",
+            f"until {date_to.strftime('%d %B %Y')}" if date_to is not None else ""]).strip()
+        title += f" {period}"
+        filename += f" {period}"
+
+    return Report(
+        title=title,
+        field_names=["Film", "Total Revenue"],
+        rows=[[FILM_FORMAT.format(film), pence / 100] for film, pence in query],
+        default_filename=filename)
+
+
+def employee_bookings_report(session, month, year):
+    """Equivalent sql for this query is:
+
+    SELECT
+        *,
+        SUM(daily_revenue.bookings) AS `booking_count`
+    FROM user
+    INNER JOIN daily_revenue ON user.id = daily_revenue.employee_id
+    WHERE
+        daily_revenue.date >= {month_start} AND
+        daily_revenue.date <= {month_end}
+    GROUP BY user.id
+    ORDER BY DESC `booking_count`"""
+    month_start, month_end = get_month_start_end(month, year)
+
+    query = session.query(User, func.sum(DailyRevenue.bookings).label("booking_count"))
+    query = query.join(DailyRevenue, DailyRevenue.employee_id == User.id)
+    query = query.filter(and_(
+            DailyRevenue.date >= month_start.date(),
+            DailyRevenue.date <= month_end.date()))
+    query = query.group_by(User.id).order_by(desc("booking_count"), User.id)
+
+    return Report(
+        title=f"Total bookings per employee for {month_start.strftime('%B %Y')}",
+        field_names=["Employee", "Total Bookings"],
+        rows=[[user.username, total_bookings] for user, total_bookings in query.all()],
+        default_filename=f"employee bookings {month_start.strftime('%B %Y')}")
@@ -0,0 +1,163 @@
+from collections import defaultdict
+from datetime import datetime, time
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, contains_eager, joinedload
+
+from database_models import session_scope, Cinema, City, Film, Screen, Showing
+from misc.utils import get_time_band
+
+
+class ShowingChanges:
+    """Records when the films, screens, cinemas or cities showings are shown and priced with
+    have been changed by sessions committed in this process.
+
+    Those can affect any showing, so indexes reload everything after them. Each commit
+    that changed them gets a new version number, so an index can tell if there has been
+    one since the version it last saw. Changes to the showings themselves, from any
+    terminal, are found by ShowingIndex checking the database instead."""
+    def __init__(self):
+        self.lock = threading.Lock()  # Sessions are committed from the background threads too
+        self.version = 0
+
+    def publish(self):
+        with self.lock:
+            self.version += 1
+
+    def since(self, version):
+        """Returns (current version, whether there have been any changes since version)."""
+        with self.lock:
+            return self.version, self.version > version
+
+
+showing_changes = ShowingChanges()
+
+RELOAD_MODELS = (Film, Screen, Cinema, City)
+
+
+@event.listens_for(Session, "after_flush")
+def record_showing_changes(session, flush_context):
+    """Remembers if a flush changed any RELOAD_MODELS, until the session is committed or rolled back."""
+    # After a flush the new, dirty and deleted collections still hold what was flushed
+    if any(isinstance(obj, RELOAD_MODELS) for obj in [*session.new, *session.deleted, *session.dirty]):
+        session.info["showing_changes"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def publish_showing_changes(session):
+    if session.info.pop("showing_changes", False):
+        showing_changes.publish()
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_showing_changes(session):
+    session.info.pop("showing_changes", None)
+
+
+class ShowingIndex:
+    """The showings at a cinema on one day, kept in memory and indexed by (film id, time band).
+
+    Loaded with one query that includes each showing's film, screen, cinema and
+    city, so the showings can be listed and priced without going back to the
+    database. refresh checks each of the day's showings in the database with one
+    small query, reading its film, screen and show time along with its film's title
+    and duration and its city's prices. Only the showings that have been added or
+    where any of those have changed since, from any terminal, are reloaded, and
+    those that have been deleted or moved to another day are dropped.
+
+    Everything is reloaded when the day changes, or when a film, screen, cinema or
+    city has been changed in this process. Other changes made to those from other
+    terminals, eg: a screen's name, are only picked up then, or when a new index is
+    built as the clerk next logs in."""
+    def __init__(self, cinema_id):
+        self.cinema_id = cinema_id
+        self.date = None
+        self.version = 0
+
+        self.showings = {}  # showing id: Showing
+        self.loaded = {}  # showing id: its key when it was loaded
+        self.index = {}  # (film id, time band): showings sorted by show time
+
+    def get(self, film_id, time_band):
+        """Gets the showings of a film in a time band, sorted by show time."""
+        return self.index.get((film_id, time_band), [])
+
+    def refresh(self, date):
+        """Brings the index up to date for date, returning whether anything was reloaded."""
+        version, reload = showing_changes.since(self.version)
+
+        if date != self.date or reload:
+            self.date = date
+            self.version = version
+            self.showings = {showing.id: showing for showing in self.load()}
+            self.loaded = {showing.id: self.key(showing) for showing in self.showings.values()}
+        else:
+            current = self.load_keys()
+            changed = {showing_id for showing_id, key in current.items() if self.loaded.get(showing_id) != key}
+            removed = self.loaded.keys() - current.keys()
+            if not changed and not removed:
+                return False
+
+            for showing_id in changed | removed:
+                self.showings.pop(showing_id, None)
+            if changed:
+                self.showings.update({showing.id: showing for showing in self.load(changed)})
+            self.loaded = current
+
+        self.build_index()
+        return True
+
+    @staticmethod
+    def key(showing):
+        """What the showing is listed and priced by, if any of these change it is reloaded."""
+        film, city = showing.film, showing.screen.cinema.city
+        return (
+            showing.film_id, showing.screen_id, showing.show_time,
+            film.title if film else None, film.duration if film else None,
+            city.morning_price, city.afternoon_price, city.evening_price)
+
+    def query_day(self, query):
+        """Limits a query joined to the screens to the showings at the cinema on the index's day."""
+        day_beginning = datetime.combine(self.date, time(hour=0, minute=0))
+        day_end = datetime.combine(self.date, time(hour=23, minute=59))
+
+        return query.filter(
+            Screen.cinema_id == self.cinema_id,
+            Showing.show_time >= day_beginning,
+            Showing.show_time <= day_end)
+
+    def load_keys(self):
+        """Gets the key of each of the day's showings, without loading them."""
+        with session_scope() as session:
+            query = session.query(
+                Showing.id, Showing.film_id, Showing.screen_id, Showing.show_time, Film.title, Film.duration,
+                City.morning_price, City.afternoon_price, City.evening_price)
+            query = query.outerjoin(Showing.film).join(Showing.screen).join(Screen.cinema).join(Cinema.city)
+            query = self.query_day(query)
+            return {showing_id: tuple(key) for showing_id, *key in query}
+
+    def load(self, showing_ids=None):
+        with session_scope() as session:
+            query = session.query(Showing).join(Showing.screen).join(Screen.cinema).join(Cinema.city)
+            query = query.options(
+                contains_eager(Showing.screen).contains_eager(Screen.cinema).contains_eager(Cinema.city),
+                joinedload(Showing.film))
+            query = self.query_day(query)
+
+            if showing_ids is not None:
+                query = query.filter(Showing.id.in_(showing_ids))
+
+            return query.all()
+
+    def build_index(self):
+        index = defaultdict(list)
+        for showing in sorted(self.showings.values(), key=lambda showing: (showing.show_time, showing.id)):
+            try:
+                time_band = get_time_band(showing.show_time)
+            except ValueError:
+                continue  # Outside of opening hours, so can't be booked
+
+            index[(showing.film_id, time_band)].append(showing)
+
+        self.index = dict(index)
@@ -0,0 +1,269 @@
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from sqlalchemy.sql import and_
+
+from database_models import session_scope, Cinema, Film, Screen, Showing
+from misc.constants import MIDNIGHT, EIGHT_AM
+from services.paging import keyset_page
+
+ShowTime = namedtuple("ShowTime", ["start_datetime", "end_datetime", "valid"])
+ScheduledShowing = namedtuple("ScheduledShowing", ["showing_id", "start", "end"])
+SchedulingConflict = namedtuple("SchedulingConflict", ["screen", "start_datetime", "end_datetime", "reason"])
+
+
+class ShowingConflictError(ValueError):
+    """Raised when a showing would overlap another showing in the same screen."""
+
+
+def get_show_times(duration, start_datetime):
+    """Works out when a showing of a film with the given duration ends,
+    and whether it starts and ends within opening hours."""
+    # timedelta addition requires datetime object, comparisons further down
+    # require time objects, hence 4 different values
+    start_time = time(hour=start_datetime.hour, minute=start_datetime.minute)
+    end_datetime = duration + start_datetime
+    end_time = time(hour=end_datetime.hour, minute=end_datetime.minute)
+
+    if start_time > MIDNIGHT and start_time < EIGHT_AM or\
+            end_time > MIDNIGHT and end_time < EIGHT_AM:
+        # starts or ends during closed hours, not a valid showtime
+        return ShowTime(start_datetime, end_datetime, False)
+    else:
+        return ShowTime(start_datetime, end_datetime, True)
+
+
+class ScreenSchedule:
+    """Sorted index of the showings in a single screen, for finding clashes.
+
+    Showings are kept as half open [start, end) intervals ordered by start,
+    along with a running maximum of their end times. A new interval clashes
+    with an existing showing if any showing that starts before the new one
+    ends, finishes after the new one starts. Because the running maximum
+    answers that for every earlier showing at once, overlap checks take
+    O(log n) time however the existing showings overlap (including one
+    showing completely containing another).
+
+    Adjacent showings (one ending at the exact minute the next starts) do
+    not clash."""
+    def __init__(self, screen_id, showings=()):
+        self.screen_id = screen_id
+        self.showings = []
+        self.starts = []
+        self.max_ends = []
+
+        for showing in sorted(showings, key=lambda s: s.start):
+            self.showings.append(showing)
+            self.starts.append(showing.start)
+            self.max_ends.append(max(showing.end, self.max_ends[-1]) if self.max_ends else showing.end)
+
+    @classmethod
+    def load(cls, session, screen_id, range_start, range_end):
+        """Builds the schedule of a screen from the showings starting between range_start and range_end."""
+        return cls.load_many(session, [screen_id], range_start, range_end)[screen_id]
+
+    @classmethod
+    def load_many(cls, session, screen_ids, range_start, range_end):
+        """Builds the schedules of several screens, returning a dict keyed by screen id.
+
+        Uses a single query of the stored start and end times, so no films are loaded."""
+        query = session.query(Showing.screen_id, Showing.id, Showing.show_time, Showing.show_end)
+        query = query.filter(Showing.screen_id.in_(screen_ids)).filter(and_(
+            Showing.show_time >= range_start,
+            Showing.show_time <= range_end
+        ))
+
+        showings = {screen_id: [] for screen_id in screen_ids}
+        for screen_id, showing_id, show_time, show_end in query:
+            showings[screen_id].append(ScheduledShowing(showing_id, show_time, show_end))
+
+        return {screen_id: cls(screen_id, screen_showings) for screen_id, screen_showings in showings.items()}
+
+    def find_conflict(self, start, end, ignore_showing_id=None):
+        """Returns a ScheduledShowing that overlaps [start, end), or None if there isn't one."""
+        # Every showing before index i starts before the new showing ends
+        i = bisect_left(self.starts, end)
+        if not i or self.max_ends[i - 1] <= start:
+            return None
+
+        # Some showing before i ends after the new one starts, walk back to find it.
+        # Usually it is the showing immediately before, unless it is being ignored
+        for j in range(i - 1, -1, -1):
+            showing = self.showings[j]
+            if showing.end > start and showing.showing_id != ignore_showing_id:
+                return showing
+            if j and self.max_ends[j - 1] <= start:
+                return None
+
+    def add(self, showing):
+        """Inserts a ScheduledShowing, keeping the index sorted."""
+        i = bisect_right(self.starts, showing.start)
+        self.showings.insert(i, showing)
+        self.starts.insert(i, showing.start)
+        self.max_ends.insert(i, showing.end)
+
+        for j in range(i, len(self.max_ends)):
+            previous = self.max_ends[j - 1] if j else showing.end
+            max_end = max(previous, self.showings[j].end)
+            if j > i and max_end == self.max_ends[j]:
+                break  # Nothing after this point changes
+            self.max_ends[j] = max_end
+
+
+def find_conflicting_showing(session, screen_id, show_times, ignore_showing_id=None):
+    """Returns a ScheduledShowing in the screen that overlaps show_times, or None if there isn't one.
+
+    The overlap check is done in the database, using the stored end time of each showing."""
+    query = session.query(Showing.id, Showing.show_time, Showing.show_end)
+    query = query.filter(Showing.screen_id == screen_id)
+    query = query.filter(Showing.overlapping(show_times.start_datetime, show_times.end_datetime))
+
+    if ignore_showing_id is not None:
+        query = query.filter(Showing.id != ignore_showing_id)
+
+    conflict = query.order_by(Showing.show_time).first()
+    return ScheduledShowing(*conflict) if conflict else None
+
+
+def list_showings(film_id=None, cinema_id=None, date=None, after=None, before=None, limit=None):
+    """Lists the showings matching the filters provided, with everything needed to display them.
+
+    Runs one query selecting only the columns that are shown, so nothing is lazy loaded
+    however many showings match. Each row has the attributes: id, title, year_published,
+    cinema_name, screen_name, show_time and show_end.
+
+    Showings are sorted by cinema, screen and show time, and can be fetched a page at a
+    time by passing the showing_sort_key of the row to page after or before, and a limit."""
+    with session_scope() as session:
+        query = session.query(
+            Showing.id, Film.title, Film.year_published, Cinema.name.label("cinema_name"),
+            Screen.name.label("screen_name"), Showing.show_time, Showing.show_end)
+        query = query.join(Showing.film).join(Showing.screen).join(Screen.cinema)
+
+        if film_id:
+            query = query.filter(Film.id == film_id)
+
+        if cinema_id:
+            query = query.filter(Cinema.id == cinema_id)
+
+        if date:
+            day_beginning = datetime.combine(date, time(hour=0, minute=0))
+            day_end = datetime.combine(date, time(hour=23, minute=59))
+
+            query = query.filter(and_(
+                Showing.show_time >= day_beginning,
+                Showing.show_time <= day_end
+            ))
+
+        return keyset_page(
+            query, [Cinema.name, Screen.name, Showing.show_time, Showing.id],
+            after=after, before=before, limit=limit)
+
+
+def showing_sort_key(row):
+    """The key list_showings sorts and pages its rows by."""
+    return (row.cinema_name, row.screen_name, row.show_time, row.id)
+
+
+def schedule_showing(film_id, screen_id, start_datetime, showing_id=None):
+    """Adds a showing of a film, or moves an existing one if showing_id is provided.
+
+    Raises ValueError if the showing would be outside of opening hours, and
+    ShowingConflictError if it would overlap another showing in the same screen."""
+    with session_scope() as session:
+        film = session.get(Film, film_id)
+        if not film:
+            raise ValueError("That film no longer exists")
+
+        screen = session.get(Screen, screen_id)
+        if not screen:
+            raise ValueError("That screen no longer exists")
+
+        show_times = get_show_times(film.duration, start_datetime)
+        if not show_times.valid:
+            raise ValueError("Film showings cannot start before 8am or end after midnight due to cinema opening hours")
+
+        # Check that showing does not conflict with any other showings in that screen
+        # at that time
+        conflict = find_conflicting_showing(session, screen_id, show_times, ignore_showing_id=showing_id)
+        if conflict:
+            raise ShowingConflictError(f"The showing you wish to create that runs from {show_times.start_datetime.strftime('%H:%M')} to {show_times.end_datetime.strftime('%H:%M')} will conflict with an existing showing that runs from {conflict.start.strftime('%H:%M')} to {conflict.end.strftime('%H:%M')} in the same screen")
+
+        if showing_id is None:
+            showing = Showing(screen=screen, film=film, show_time=show_times.start_datetime)
+            session.add(showing)
+        else:
+            showing = session.get(Showing, showing_id)
+            if not showing:
+                raise ValueError("That showing no longer exists")
+
+            showing.screen = screen
+            showing.film = film
+            showing.show_time = show_times.start_datetime
+
+        return showing
+
+
+def schedule_recurring_showings(film_id, screen_ids, show_times, first_day, last_day):
+    """Adds a showing of a film in each screen at each of show_times, every day from first_day to last_day.
+
+    show_times is a list of datetime.time objects. Every occurrence is checked against
+    opening hours, existing showings and the other new occurrences in one pass. The
+    occurrences that are fine are inserted together in a single transaction, and a
+    SchedulingConflict is returned for every one that isn't.
+
+    Returns a tuple of (number of showings added, list of SchedulingConflicts)."""
+    if first_day > last_day:
+        raise ValueError("The first day of a recurring showing cannot be after its last day")
+
+    if not show_times:
+        raise ValueError("Please give atleast one show time")
+
+    with session_scope() as session:
+        film = session.get(Film, film_id)
+        if not film:
+            raise ValueError("That film no longer exists")
+
+        screens = session.query(Screen).filter(Screen.id.in_(screen_ids)).order_by(Screen.id).all()
+        if len(screens) != len(set(screen_ids)):
+            raise ValueError("One or more of the selected screens no longer exist")
+
+        range_start = datetime.combine(first_day, time(hour=0, minute=0))
+        range_end = datetime.combine(last_day, time(hour=23, minute=59))
+        schedules = ScreenSchedule.load_many(session, [screen.id for screen in screens], range_start, range_end)
+
+        new_showings = []
+        conflicts = []
+
+        for day in range((last_day - first_day).days + 1):
+            date = first_day + timedelta(days=day)
+
+            for screen in screens:
+                for show_time in sorted(show_times):
+                    times = get_show_times(film.duration, datetime.combine(date, show_time))
+
+                    if not times.valid:
+                        conflicts.append(SchedulingConflict(
+                            screen.name, times.start_datetime, times.end_datetime,
+                            "outside of cinema opening hours"))
+                        continue
+
+                    clash = schedules[screen.id].find_conflict(times.start_datetime, times.end_datetime)
+                    if clash:
+                        conflicts.append(SchedulingConflict(
+                            screen.name, times.start_datetime, times.end_datetime,
+                            f"conflicts with a showing from {clash.start.strftime('%H:%M')} to {clash.end.strftime('%H:%M')}"))
+                        continue
+
+                    # Not in the database yet, but later occurrences still need to avoid it
+                    schedules[screen.id].add(ScheduledShowing(None, times.start_datetime, times.end_datetime))
+                    new_showings.append({
+                        "screen_id": screen.id,
+                        "film_id": film.id,
+                        "show_time": times.start_datetime,
+                        "show_end": times.end_datetime})  # Bulk inserts skip the flush listener that sets this
+
+        session.bulk_insert_mappings(Showing, new_showings)
+
+        return len(new_showings), conflicts
@@ -0,0 +1,149 @@
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+
+
+class TaskCancelled(Exception):
+    """Raised inside a task by its TaskProgress once the task has been cancelled."""
+
+
+class TaskProgress:
+    """Passed to tasks submitted with on_progress, as their progress keyword argument.
+
+    Tasks call it as they go with how much they have done out of the total (None if
+    it isn't known yet) and what they are doing. The latest call is passed on to
+    on_progress back on the Tk thread the next time the tasks are polled.
+
+    A task that has already started can't be stopped from outside, so once it has
+    been cancelled the next call raises TaskCancelled to stop it part way through."""
+
+    def __init__(self):
+        self.latest = None  # (done, total, stage), set on the worker thread
+        self.reported = None
+        self.cancelled = threading.Event()
+
+    def __call__(self, done, total=None, stage=None):
+        if self.cancelled.is_set():
+            raise TaskCancelled()
+
+        self.latest = (done, total, stage)
+
+
+class BackgroundTasks:
+    """Runs functions on a thread pool, then calls back on the Tk thread with their results.
+
+    Tk can only be used from the thread that created it, so workers never call
+    back directly. Finished work is put on a queue instead, which is polled with
+    after() while there is anything pending.
+
+    If the owner widget given to submit is destroyed first, the task is cancelled,
+    or its result thrown away if it had already started."""
+    POLL_INTERVAL = 15  # ms
+
+    def __init__(self, root, max_workers=2, thread_name_prefix="background"):
+        self.root = root
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self.finished = queue.SimpleQueue()  # futures that have finished, put there by the workers
+
+        self.callbacks = {}  # future: (on_done, on_error, owner widget name)
+        self.progress = {}  # future: (TaskProgress, on_progress), for tasks that report their progress
+        self.owners = {}  # owner widget name: set of its pending futures
+        self.polling = False
+
+    def submit(self, function, *args, owner=None, on_done=None, on_error=None, on_progress=None):
+        """Runs function(*args) on a worker thread.
+
+        on_done is called with the result, or on_error with the exception, back on the
+        Tk thread. If on_progress is given, function is also passed a TaskProgress as
+        its progress keyword argument, and on_progress is called with (done, total, stage)
+        as the task reports them. Returns the future, which can be passed to cancel."""
+        if on_progress is None:
+            future = self.executor.submit(function, *args)
+        else:
+            progress = TaskProgress()
+            future = self.executor.submit(function, *args, progress=progress)
+            self.progress[future] = (progress, on_progress)
+
+        owner_name = None
+        if owner is not None:
+            owner_name = str(owner)
+            if owner_name not in self.owners:
+                self.owners[owner_name] = set()
+                owner.bind("<Destroy>", self.owner_destroyed, add="+")
+            self.owners[owner_name].add(future)
+
+        self.callbacks[future] = (on_done, on_error, owner_name)
+        future.add_done_callback(self.finished.put)  # Called on the worker thread
+
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.POLL_INTERVAL, self.poll)
+
+        return future
+
+    def cancel(self, future):
+        """Stops future from running if it hasn't started, and makes sure its callbacks are never called.
+
+        Tasks that report their progress are also stopped the next time they do."""
+        future.cancel()
+        if future in self.progress:
+            self.progress[future][0].cancelled.set()
+        self.forget(future)
+
+    def forget(self, future):
+        """Stops tracking future, returning its callbacks."""
+        self.progress.pop(future, None)
+        on_done, on_error, owner_name = self.callbacks.pop(future, (None, None, None))
+        if owner_name is not None:
+            self.owners.get(owner_name, set()).discard(future)
+
+        return on_done, on_error
+
+    def poll(self):
+        """Calls back with the progress of every running task, and the result of every task that has finished."""
+        for progress, on_progress in list(self.progress.values()):
+            latest = progress.latest
+            if latest is not None and latest != progress.reported:
+                progress.reported = latest
+                on_progress(*latest)
+
+        while True:
+            try:
+                future = self.finished.get_nowait()
+            except queue.Empty:
+                break
+
+            if future not in self.callbacks or future.cancelled():
+                self.forget(future)
+                continue  # Cancelled, nobody is waiting for it
+
+            on_done, on_error = self.forget(future)
+            error = future.exception()
+            if error is not None:
+                if on_error:
+                    on_error(error)
+            elif on_done:
+                on_done(future.result())
+
+        if self.callbacks:
+            self.root.after(self.POLL_INTERVAL, self.poll)
+        else:
+            self.polling = False
+
+    def owner_destroyed(self, event):
+        self.cancel_owner(event.widget)
+        self.owners.pop(str(event.widget), None)
+
+    def cancel_owner(self, owner):
+        """Cancels the pending tasks of an owner widget, eg: when it is destroyed or hidden."""
+        owner_name = str(owner)
+        if owner_name not in self.owners:
+            return  # Never owned anything, eg: the destroy event of an owner's child
+
+        futures, self.owners[owner_name] = self.owners[owner_name], set()
+        for future in futures:
+            self.cancel(future)
+
+    def shutdown(self):
+        """Cancels everything that hasn't started, for when the application is closing."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
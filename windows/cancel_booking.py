@@ -1,6 +1,7 @@
 from tkinter import ttk, messagebox
 
 from database_models import session, Showing, Cinema, Film, Screen, Genre, AgeRatings, Booking
+from services import get_booking, cancel_booking
 from windows import FilmShowingWindow, FilmWindow
 
 class cancelBooking(ttk.Frame):
@@ -25,16 +26,17 @@ class cancelBooking(ttk.Frame):
     def cancel_pressed(self):
         booking_id = self.booking_reference.get().strip()
 
-        booking = session.query(Booking).get(booking_id)
-        if not booking:
-            messagebox.showerror(
-                title="Invalid Booking Reference",
-                message=f"The booking #{booking_id} does not exist")
+        try:
+            booking = get_booking(booking_id)
+        except ValueError as e:
+            messagebox.showerror(title="Invalid Booking Reference", message=e)
             return
 
         response = messagebox.askyesno(title="Are you sure?",
             message=f"Are you sure you want to cancel the booking #{booking.id} for {booking.name} seeing {booking.showing.film.title}?")
 
         if response:
-            session.delete(booking)
-            session.commit()
\ No newline at end of file
+            try:
+                cancel_booking(booking.id)
+            except ValueError as e:
+                messagebox.showerror(title="Invalid Booking Reference", message=e)
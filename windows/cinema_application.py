@@ -2,37 +2,66 @@ from functools import partial
 from tkinter import Tk, ttk, Menu, Toplevel
 from typing import Optional
 
-from PIL import ImageTk, Image
-
 from database_models import session, Authority
 from windows import FilmShowingWindow, FilmWindow, GenreWindow, ReportWindow, LoginWindow, NewBooking, cancelBooking, LocationWindow
+from windows.background import BackgroundTasks
+from windows.image_loader import ImageLoader
 
 
 class CinemaApplication(Tk):
+    # Windows that are slow to build, so are hidden rather than destroyed when switching
+    # away from them, then refreshed when switched back to
+    CACHED_WINDOWS = (NewBooking, FilmWindow, FilmShowingWindow)
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        # Load icon assets for use throughout application
-        self.add_icon = ImageTk.PhotoImage(Image.open("assets/plus-solid.png").resize((15, 15)))
-        self.delete_icon = ImageTk.PhotoImage(Image.open("assets/trash-solid.png").resize((15, 15)))
-        self.update_icon = ImageTk.PhotoImage(Image.open("assets/pen-solid.png").resize((15, 15)))
-        self.view_icon = ImageTk.PhotoImage(Image.open("assets/eye-solid.png").resize((15, 15)))
+        self.window_cache = {}  # window class: instance, for the CACHED_WINDOWS
+
+        # Loads data and images in the background for every window
+        self.background_tasks = BackgroundTasks(self)
+        self.image_loader = ImageLoader(self)
+
+        # Load icon assets for use throughout application, they stay blank until loaded
+        self.add_icon = self.image_loader.load("assets/plus-solid.png", (15, 15), placeholder=None)
+        self.delete_icon = self.image_loader.load("assets/trash-solid.png", (15, 15), placeholder=None)
+        self.update_icon = self.image_loader.load("assets/pen-solid.png", (15, 15), placeholder=None)
+        self.view_icon = self.image_loader.load("assets/eye-solid.png", (15, 15), placeholder=None)
+
+    def destroy(self):
+        self.background_tasks.shutdown()
+        self.image_loader.shutdown()
+        super().destroy()
 
     def switch_window(self, window: ttk.Frame, resizeable: bool = True, kwargs: Optional[dict] = None):
         """Replaces window content.
 
         Clears the current contents of the window (if there are any)
-        and then creates and inserts the new frame that is specified."""
+        and then creates and inserts the new frame that is specified.
+
+        Windows in CACHED_WINDOWS are only hidden, and the same instance
+        is refreshed with kwargs the next time it is switched to."""
+        kwargs = kwargs if kwargs else {}
+
         if self.current_window:
-            # delete current window
             self.unbind("<Configure>")  # If a resize callback was bound, unbind it
             self.current_window.grid_forget()
-            self.current_window.destroy()
 
-        if kwargs:
-            self.current_window = window(self, **kwargs)
+            if type(self.current_window) in self.CACHED_WINDOWS:
+                # Keep current window, but stop any work it has in the background
+                if hasattr(self.current_window, "suspend"):
+                    self.current_window.suspend()
+            else:
+                # delete current window
+                self.current_window.destroy()
+
+        if window in self.window_cache:
+            self.current_window = self.window_cache[window]
+            self.current_window.refresh(**kwargs)
         else:
-            self.current_window = window(self)
+            self.current_window = window(self, **kwargs)
+            if window in self.CACHED_WINDOWS:
+                self.window_cache[window] = self.current_window
 
         self.current_window.grid(row=0, column=0, sticky="nsew")
         self.columnconfigure(0, weight=1)
@@ -129,6 +158,11 @@ class CinemaApplication(Tk):
         self.menubar.destroy()
         self.switch_window(LoginWindow, resizeable=False)
 
+        # The next user may work at another cinema, or not be allowed to see these windows
+        for cached_window in self.window_cache.values():
+            cached_window.destroy()
+        self.window_cache = {}
+
     @staticmethod
     def show_preferences_dialog():
         """TODO: Implement a settings popup"""
@@ -1,18 +1,19 @@
-from collections import namedtuple
 from datetime import datetime, time
 from functools import partial
 import re
 
-from tkinter import ttk, messagebox, font, BooleanVar
-from tkcalendar import Calendar
-from sqlalchemy.sql import and_
+from tkinter import ttk, messagebox, font, BooleanVar, Listbox, StringVar
+from tkcalendar import Calendar, DateEntry
 
 from database_models import session, Showing, Cinema, Film, Screen
-from misc.constants import ADD, EDIT, FILM_FORMAT, MIDNIGHT, EIGHT_AM
+from misc.constants import ADD, EDIT, FILM_FORMAT
+from services import get_show_times, list_showings, showing_sort_key, schedule_showing, schedule_recurring_showings
+from windows.virtual_treeview import VirtualTreeview
 
 film_regex = re.compile(r"(?P<title>.*) \((?P<year_published>\d{4})\)")
+show_time_regex = re.compile(r"^(?P<hour>\d{1,2}):(?P<minute>\d{2})$")
 
-ShowTime = namedtuple("ShowTime", ["start_datetime", "end_datetime", "valid"])
+MAX_LISTED_CONFLICTS = 20  # Any more and the messagebox won't fit on screen
 
 
 class FilmShowingWindow(ttk.Frame):
@@ -33,40 +34,19 @@ class FilmShowingWindow(ttk.Frame):
             "Show Time"
         ]
 
-        self.treeview = ttk.Treeview(self,
-            columns=tuple(i for i in range(len(headings))),
-            show="headings",
-            selectmode="browse")  # Only allow one row to be selected at once
-        self.treeview_scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.treeview.yview)
-        self.treeview["yscrollcommand"] = self.treeview_scrollbar.set
-        for i, value in enumerate(headings):
-            self.treeview.column(i, stretch=True)
-            self.treeview.heading(i, text=value)
-
-        self.treeview.bind("<<TreeviewSelect>>", self.treeview_select)
+        self.treeview = VirtualTreeview(self, headings, fetch_page=self.fetch_showings_page)
+        self.treeview.tree.bind("<<TreeviewSelect>>", self.treeview_select, add="+")
 
         self.filter_frame = ttk.LabelFrame(self, text="Filters")
 
         self.cinema_label = ttk.Label(self.filter_frame, text="Cinema")
         self.cinema_combobox = ttk.Combobox(self.filter_frame)
-        self.cinema_combobox["values"] = ["- All Cinemas -"] + [cinema.name for cinema in session.query(Cinema).all()]
         self.cinema_combobox.state(["readonly"])
-        if self.cinema_filter:
-            cinema = session.query(Cinema).get(self.cinema_filter)
-            self.cinema_combobox.set(cinema.name)
-        else:
-            self.cinema_combobox.set("- All Cinemas -")
         self.cinema_combobox.bind("<<ComboboxSelected>>", self.cinema_filter_change)
 
         self.film_label = ttk.Label(self.filter_frame, text="Film")
         self.film_combobox = ttk.Combobox(self.filter_frame)
-        self.film_combobox["values"] = ["- All Films -"] + [FILM_FORMAT.format(film) for film in session.query(Film).all()]
         self.film_combobox.state(["readonly"])
-        if self.film_filter:
-            film = session.query(Film).get(self.film_filter)
-            self.film_combobox.set(FILM_FORMAT.format(film))
-        else:
-            self.film_combobox.set("- All Films -")
         self.film_combobox.bind("<<ComboboxSelected>>", self.film_filter_change)
 
         self.date_label = ttk.Label(self.filter_frame, text="Date")
@@ -93,6 +73,10 @@ class FilmShowingWindow(ttk.Frame):
             self.button_frame, text="Add", image=parent.add_icon,
             compound="left", command=self.add_showing)
 
+        self.add_recurring_button = ttk.Button(
+            self.button_frame, text="Add Recurring", image=parent.add_icon,
+            compound="left", command=self.add_recurring_showings)
+
         self.delete_showing_button = ttk.Button(
             self.button_frame, text="Delete", image=parent.delete_icon,
             compound="left", command=self.delete_showing)
@@ -103,9 +87,8 @@ class FilmShowingWindow(ttk.Frame):
 
         # Gridding
         self.treeview.grid(column=0, row=0, sticky="nsew")
-        self.treeview_scrollbar.grid(column=1, row=0, sticky="ns")
 
-        self.filter_frame.grid(column=2, row=0, sticky="nsew")
+        self.filter_frame.grid(column=1, row=0, sticky="nsew")
 
         self.cinema_label.grid(column=0, row=0, sticky="w")
         self.cinema_combobox.grid(column=0, row=1, sticky="ew")
@@ -117,65 +100,91 @@ class FilmShowingWindow(ttk.Frame):
         self.date_checkbutton.grid(column=0, row=5, sticky="w")
         self.date_calendar.grid(column=0, row=6, sticky="ew")
 
-        self.button_frame.grid(column=0, row=1, columnspan=3, sticky="nsew")
+        self.button_frame.grid(column=0, row=1, columnspan=2, sticky="nsew")
 
         self.add_showing_button.grid(column=0, row=0)
-        self.delete_showing_button.grid(column=1, row=0)
-        self.update_showing_button.grid(column=2, row=0)
+        self.add_recurring_button.grid(column=1, row=0)
+        self.delete_showing_button.grid(column=2, row=0)
+        self.update_showing_button.grid(column=3, row=0)
 
         self.columnconfigure(0, weight=1)
-        self.columnconfigure(1, weight=0)
-        self.columnconfigure(2, minsize=230, weight=0)
+        self.columnconfigure(1, minsize=230, weight=0)
 
         self.rowconfigure(0, weight=1)
         self.rowconfigure(1, weight=0)
 
+        self.load_filters()
+
         # Needs to happen last so that buttons exist
         self.populate_treeview()
 
+    def load_filters(self):
+        """Fills the filter comboboxes with the current cinemas and films, selecting the filters set."""
+        self.cinema_combobox["values"] = ["- All Cinemas -"] + [cinema.name for cinema in session.query(Cinema).all()]
+        if self.cinema_filter:
+            cinema = session.query(Cinema).get(self.cinema_filter)
+            self.cinema_combobox.set(cinema.name)
+        else:
+            self.cinema_combobox.set("- All Cinemas -")
+
+        self.film_combobox["values"] = ["- All Films -"] + [FILM_FORMAT.format(film) for film in session.query(Film).all()]
+        if self.film_filter:
+            film = session.query(Film).get(self.film_filter)
+            self.film_combobox.set(FILM_FORMAT.format(film))
+        else:
+            self.film_combobox.set("- All Films -")
+
+    def refresh(self, film_filter=None, cinema_filter=None):
+        """Called when switching back to this window, as it is kept rather than recreated.
+
+        Takes the same filters as when the window is created, any not given are cleared."""
+        self.film_filter = film_filter
+        self.cinema_filter = cinema_filter
+        self.date_filter = None
+        self.date_checkbutton_value.set(False)
+
+        self.load_filters()
+        self.populate_treeview()
+
     def populate_treeview(self):
-        """Clears the treeview and then refills it with all the showings
-        that match the currently selected filters."""
-        self.treeview.delete(*self.treeview.get_children())
+        """Clears the treeview and then refills it with the first page of
+        showings that match the currently selected filters."""
+        self.treeview.reset()
 
         # Contents have changed, so selection is cleared, disable buttons that require one
         self.delete_showing_button.state(["disabled"])
         self.update_showing_button.state(["disabled"])
 
-        for showing in self.film_showing_query():
-            start = showing.show_time
-            end = showing.show_end
-
-            self.treeview.insert(
-                "", "end", iid=showing.id,
-                values=(
-                    FILM_FORMAT.format(showing.film),
-                    showing.screen.cinema.name,
-                    showing.screen.name,
-                    f"{start.strftime('%d/%m/%Y')} {start.strftime('%H:%M')} - {end.strftime('%H:%M')}"))
-
-    def film_showing_query(self):
-        """Generates and executes a query collecting all film
-        showings that match the current filters."""
-        query = session.query(Showing).join(Showing.screen).join(Screen.cinema)
-        query = query.order_by(Cinema.name, Screen.name)
+    def refresh_treeview(self):
+        """Reloads the showings in the treeview after one has been added, updated
+        or deleted, keeping the scroll position and the selection if it still exists."""
+        self.treeview.refresh()
 
-        if self.film_filter:
-            query = query.join(Showing.film).filter(Film.id == self.film_filter)
+        if not self.treeview.selection():
+            self.delete_showing_button.state(["disabled"])
+            self.update_showing_button.state(["disabled"])
 
-        if self.cinema_filter:
-            query = query.filter(Cinema.id == self.cinema_filter)
+    def fetch_showings_page(self, after=None, before=None, limit=None):
+        """Fetches a page of the showings that match the current filters for the treeview."""
+        rows = []
+        for showing in self.film_showing_query(after=after, before=before, limit=limit):
+            start = showing.show_time
+            end = showing.show_end
 
-        if self.date_filter:
-            day_beginning = datetime.combine(self.date_filter, time(hour=0, minute=0))
-            day_end = datetime.combine(self.date_filter, time(hour=23, minute=59))
+            rows.append((showing_sort_key(showing), showing.id, (
+                FILM_FORMAT.format(showing),
+                showing.cinema_name,
+                showing.screen_name,
+                f"{start.strftime('%d/%m/%Y')} {start.strftime('%H:%M')} - {end.strftime('%H:%M')}")))
 
-            query = query.filter(and_(
-                Showing.show_time >= day_beginning,
-                Showing.show_time <= day_end
-            ))
+        return rows
 
-        return query.all()
+    def film_showing_query(self, after=None, before=None, limit=None):
+        """Collects the film showings that match the current filters,
+        as rows containing just the values displayed in the treeview."""
+        return list_showings(
+            film_id=self.film_filter, cinema_id=self.cinema_filter, date=self.date_filter,
+            after=after, before=before, limit=limit)
 
     def treeview_select(self, event):
         """Listens to the selection event on the treeview,
@@ -261,7 +270,12 @@ class FilmShowingWindow(ttk.Frame):
     def add_showing(self):
         added = self.master.show_modal(FilmShowingEditDialog, {"edit_type": ADD})
         if added:
-            self.populate_treeview()
+            self.refresh_treeview()
+
+    def add_recurring_showings(self):
+        added = self.master.show_modal(RecurringShowingDialog)
+        if added:
+            self.refresh_treeview()
 
     def delete_showing(self):
         if not (selected_id := self.check_selection()):
@@ -281,7 +295,8 @@ class FilmShowingWindow(ttk.Frame):
         session.delete(showing)
         session.commit()
 
-        self.populate_treeview()
+        self.treeview.deselect()
+        self.refresh_treeview()
 
     def update_showing(self):
         if not (selected_id := self.check_selection()):
@@ -296,7 +311,7 @@ class FilmShowingWindow(ttk.Frame):
         })
 
         if updated:
-            self.populate_treeview()
+            self.refresh_treeview()
 
 
 class FilmShowingEditDialog(ttk.Frame):
@@ -450,20 +465,9 @@ class FilmShowingEditDialog(ttk.Frame):
 
     def calc_show_start_end(self, film, hour, minute):
         selected_date = self.show_date_calendar.selection_get()
+        start_datetime = datetime.combine(selected_date, time(hour=hour, minute=minute))
 
-        # timedelta addition requires datetime object, comparisons further down
-        # require time objects, hence 4 different values
-        start_time = time(hour=hour, minute=minute)
-        start_datetime = datetime.combine(selected_date, start_time)
-        end_datetime = film.duration + start_datetime
-        end_time = time(hour=end_datetime.hour, minute=end_datetime.minute)
-
-        if start_time > MIDNIGHT and start_time < EIGHT_AM or\
-                end_time > MIDNIGHT and end_time < EIGHT_AM:
-            # starts or ends during closed hours, not a valid showtime
-            return ShowTime(start_datetime, end_datetime, False)
-        else:
-            return ShowTime(start_datetime, end_datetime, True)
+        return get_show_times(film.duration, start_datetime)
 
     def recalc_show_end(self, event):
         """Called whenever something to do with show time is changed,
@@ -525,43 +529,147 @@ class FilmShowingEditDialog(ttk.Frame):
             messagebox.showerror(title="Error", message="Please select a start time")
             return
 
-        show_times = self.calc_show_start_end(film, hour, minute)
-        if not show_times.valid:
-            messagebox.showerror(title="Error", message="Film showings cannot start before 8am or end after midnight due to cinema opening hours")
+        start_datetime = datetime.combine(self.show_date_calendar.selection_get(), time(hour=hour, minute=minute))
+        showing_id = self.showing.id if self.edit_type == EDIT else None
+
+        try:
+            schedule_showing(film.id, screen.id, start_datetime, showing_id=showing_id)
+        except ValueError as e:
+            messagebox.showerror(title="Error", message=e)
             return
 
-        # Check that showing does not conflict with any other showings in that screen
-        # at that time
-        day_beginning = show_times.start_datetime.replace(hour=0, minute=0)
-        day_end = show_times.start_datetime.replace(hour=23, minute=59)
+        if self.edit_type == EDIT:
+            session.expire(self.showing)  # Was updated through another session
 
-        query = session.query(Showing).join(Showing.screen).filter(Screen.id == screen.id)
-        query = query.filter(and_(
-            Showing.show_time >= day_beginning,
-            Showing.show_time <= day_end
-        ))
-        screen_showings = query.all()  # Narrow search pool to showings on the same day in the same screen
+        self.result = True
+        self.dismiss()
+
+
+class RecurringShowingDialog(ttk.Frame):
+    """Dialog for adding showings of a film at the same times every day
+    between two dates, in one or more screens at a cinema."""
+    def __init__(self, parent, *args, **kwargs):
+        self.dismiss = kwargs.pop("dismiss")
+        parent.title("Add Recurring Film Showings")
+
+        kwargs["padding"] = (3, 3, 3, 3)
+        super().__init__(parent, *args, **kwargs)
 
-        for showing in screen_showings:
-            if self.edit_type == EDIT and self.showing == showing:
+        # Widget Creation
+        self.film_label = ttk.Label(self, text="Film:")
+        self.cinema_label = ttk.Label(self, text="Cinema:")
+        self.screens_label = ttk.Label(self, text="Screens:")
+        self.first_day_label = ttk.Label(self, text="From:")
+        self.last_day_label = ttk.Label(self, text="Until:")
+        self.show_times_label = ttk.Label(self, text="Show Times:")
+
+        self.film_combobox = ttk.Combobox(self)
+        self.film_combobox["values"] = [FILM_FORMAT.format(film) for film in session.query(Film).order_by(Film.title, Film.year_published).all()]
+        self.film_combobox.state(["readonly"])
+
+        self.cinema_combobox = ttk.Combobox(self)
+        self.cinema_combobox["values"] = [cinema.name for cinema in session.query(Cinema).order_by(Cinema.name).all()]
+        self.cinema_combobox.state(["readonly"])
+        self.cinema_combobox.bind("<<ComboboxSelected>>", self.cinema_selected)
+
+        self.screens = []
+        self.screen_choices = StringVar(value=[])
+        self.screens_listbox = Listbox(self, listvariable=self.screen_choices, height=4, selectmode="extended", exportselection=False)
+
+        self.first_day_entry = DateEntry(self, locale="en_GB")
+        self.last_day_entry = DateEntry(self, locale="en_GB")
+
+        self.show_times_entry = ttk.Entry(self)
+        self.show_times_hint = ttk.Label(self, text="Comma separated 24 hour times, eg: 14:00, 19:30")
+
+        self.button_frame = ttk.Frame(self)
+        self.submit_button = ttk.Button(self.button_frame, text=ADD, command=self.submit)
+        self.cancel_button = ttk.Button(self.button_frame, text="Cancel", command=self.dismiss)
+
+        # Gridding
+        widgets = [
+            (self.film_label, self.film_combobox),
+            (self.cinema_label, self.cinema_combobox),
+            (self.screens_label, self.screens_listbox),
+            (self.first_day_label, self.first_day_entry),
+            (self.last_day_label, self.last_day_entry),
+            (self.show_times_label, self.show_times_entry)
+        ]
+
+        for y, (label, entry) in enumerate(widgets):
+            label.grid(column=0, row=y, pady=2, sticky="w")
+            entry.grid(column=1, row=y, pady=2, sticky="ew")
+
+        self.show_times_hint.grid(column=1, row=len(widgets), sticky="w")
+
+        self.button_frame.grid(column=0, row=len(widgets) + 1, columnspan=2)
+        self.submit_button.grid(column=0, row=0)
+        self.cancel_button.grid(column=1, row=0)
+
+    def cinema_selected(self, event):
+        """When a cinema is selected the list of screens available to
+        choose from is updated."""
+        cinema = session.query(Cinema).filter_by(name=self.cinema_combobox.get()).first()
+        if not cinema:
+            return  # Shouldn't happen
+
+        self.screens = session.query(Screen).filter_by(cinema=cinema).order_by(Screen.name).all()
+        self.screen_choices.set([screen.name for screen in self.screens])
+
+    def parse_show_times(self):
+        show_times = []
+
+        for value in self.show_times_entry.get().split(","):
+            if not value.strip():
                 continue
 
-            if show_times.start_datetime >= showing.show_time and\
-                    show_times.start_datetime <= showing.show_end or\
-                    show_times.end_datetime >= showing.show_time and\
-                    show_times.end_datetime <= showing.show_end:
+            match = show_time_regex.match(value.strip())
+            try:
+                show_times.append(time(hour=int(match.group("hour")), minute=int(match.group("minute"))))
+            except (AttributeError, ValueError):
+                raise ValueError(f"'{value.strip()}' is not a valid show time")
 
-                messagebox.showerror(title="Error",
-                message=f"The showing you wish to create that runs from {show_times.start_datetime.strftime('%H:%M')} to {show_times.end_datetime.strftime('%H:%M')} will conflict with an existing showing that runs from {showing.show_time.strftime('%H:%M')} to {showing.show_end.strftime('%H:%M')} in the same screen")
-                return
+        return show_times
 
-        if self.edit_type == ADD:
-            session.add(Showing(screen=screen, film=film, show_time=show_times.start_datetime))
-        elif self.edit_type == EDIT:
-            self.showing.screen = screen
-            self.showing.film = film
-            self.showing.show_time = show_times.start_datetime
+    def submit(self):
+        match = film_regex.match(self.film_combobox.get())
+        if not match:
+            messagebox.showerror(title="Error", message="Please select a film")
+            return
 
-        session.commit()
-        self.result = True
-        self.dismiss()
\ No newline at end of file
+        film = session.query(Film).filter_by(
+            title=match.group("title"),
+            year_published=match.group("year_published")).first()
+        if not film:
+            messagebox.showerror(title="Error", message="That film no longer exists")
+            return
+
+        screen_ids = [self.screens[i].id for i in self.screens_listbox.curselection()]
+        if not screen_ids:
+            messagebox.showerror(title="Error", message="Please select atleast one screen")
+            return
+
+        try:
+            added, conflicts = schedule_recurring_showings(
+                film.id, screen_ids, self.parse_show_times(),
+                self.first_day_entry.get_date(), self.last_day_entry.get_date())
+        except ValueError as e:
+            messagebox.showerror(title="Error", message=e)
+            return
+
+        message = f"{added} showings of {FILM_FORMAT.format(film)} have been added."
+        if conflicts:
+            message += f" The following {len(conflicts)} showings could not be added:\n\n"
+            message += "\n".join(
+                f"{conflict.screen} {conflict.start_datetime.strftime('%d/%m/%Y %H:%M')} - {conflict.end_datetime.strftime('%H:%M')}: {conflict.reason}"
+                for conflict in conflicts[:MAX_LISTED_CONFLICTS])
+            if len(conflicts) > MAX_LISTED_CONFLICTS:
+                message += f"\n...and {len(conflicts) - MAX_LISTED_CONFLICTS} more"
+
+        if conflicts:
+            messagebox.showwarning(title="Recurring Showings", message=message)
+        else:
+            messagebox.showinfo(title="Recurring Showings", message=message)
+
+        self.result = bool(added)
+        self.dismiss()
@@ -3,12 +3,13 @@ import shutil
 import os
 
 from tkinter import ttk, messagebox, Text, Listbox, StringVar, filedialog
-from PIL import ImageTk, Image
 
 from database_models import session, Film, Genre, AgeRatings
-from misc.constants import OLDEST_FILM_YEAR, LONGEST_FILM_HOURS, ADD, EDIT
+from misc.constants import OLDEST_FILM_YEAR, LONGEST_FILM_HOURS, ADD, EDIT, PLACEHOLDER_POSTER, POSTER_SIZE
 from misc.utils import get_hours_minutes
+from services import list_films, film_sort_key
 from windows import FilmShowingWindow
+from windows.virtual_treeview import VirtualTreeview
 
 
 class FilmWindow(ttk.Frame):
@@ -30,19 +31,9 @@ class FilmWindow(ttk.Frame):
             "Duration",
             "Rating"
         ]
-        self.treeview = ttk.Treeview(self,
-            columns=tuple(i for i in range(len(headings))),
-            show="headings",
-            selectmode="browse")  # Only allow one row to be selected at once
-        self.treeview_scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.treeview.yview)
-        self.treeview["yscrollcommand"] = self.treeview_scrollbar.set
-        for i, value in enumerate(headings):
-            self.treeview.column(i, stretch=True)
-            self.treeview.heading(i, text=value)
-        self.treeview.bind("<<TreeviewSelect>>", self.treeview_select)
-
-        for film in session.query(Film).order_by(Film.title).all():
-            self.treeview_insert(film)
+        self.treeview = VirtualTreeview(self, headings, fetch_page=self.fetch_films_page)
+        self.treeview.tree.bind("<<TreeviewSelect>>", self.treeview_select, add="+")
+        self.treeview.reset()
 
         # --- Inspect Film Section ---
         self.inspect_frame = ttk.Frame(self)
@@ -80,7 +71,6 @@ class FilmWindow(ttk.Frame):
 
         # --- Gridding ---
         self.treeview.grid(column=0, row=0, sticky="nsew")
-        self.treeview_scrollbar.grid(column=1, row=0, sticky="ns")
 
         self.inspect_frame.grid(column=0, row=1, sticky="nsew")
 
@@ -93,7 +83,6 @@ class FilmWindow(ttk.Frame):
             widget.grid(column=x, row=0)
 
         self.columnconfigure(0, weight=1)
-        self.columnconfigure(1, weight=0)
 
         self.rowconfigure(0, minsize=100, weight=1)
         self.rowconfigure(1, minsize=160, weight=0)
@@ -107,27 +96,19 @@ class FilmWindow(ttk.Frame):
         key, _ = current_text.split(":", maxsplit=1)
         label["text"] = f"{key}: {new_value}"
 
-    def treeview_insert(self, film):
-        h, m = get_hours_minutes(film.duration.total_seconds())
-
-        self.treeview.insert(
-            "", "end", iid=film.id,
-            values=(
+    @staticmethod
+    def fetch_films_page(after=None, before=None, limit=None):
+        """Fetches a page of films, sorted by title, for the treeview."""
+        rows = []
+        for film in list_films(after=after, before=before, limit=limit):
+            rows.append((film_sort_key(film), film.id, (
                 film.title,
                 film.year_published,
                 film.age_rating.value,
                 film.string_conv("duration"),
-                film.string_conv("rating")))
+                film.string_conv("rating"))))
 
-    def treeview_sort(self):
-        """Sort treeview by Title column."""
-        # Fetch the contents of the title column and the iid for each item in the tree
-        children = [(self.treeview.set(iid, 0), iid) for iid in self.treeview.get_children()]
-        children.sort(key=lambda child: child[0])  # Sort by title
-
-        # Rearrange items in sorted position
-        for index, (_, iid) in enumerate(children):
-            self.treeview.move(iid, "", index)
+        return rows
 
     def treeview_select(self, event):
         """Listens to the treeview select virtual event to update the inspect section."""
@@ -140,7 +121,7 @@ class FilmWindow(ttk.Frame):
         self.delete_film_button.state(["!disabled"])
         self.update_film_button.state(["!disabled"])
 
-        if self.inspected_film_id == int(self.treeview.selection()[0]):
+        if self.inspected_film_id == selected_id:
             return
 
         selected_film = session.query(Film).get(selected_id)
@@ -187,8 +168,7 @@ class FilmWindow(ttk.Frame):
         if not new_film:
             return
 
-        self.treeview_insert(new_film)
-        self.treeview_sort()
+        self.treeview.refresh()
 
     def delete_film(self):
         """Callback for delete button."""
@@ -207,7 +187,8 @@ class FilmWindow(ttk.Frame):
 
         session.delete(selected_film)
         session.commit()
-        self.treeview.delete(str(selected_id))
+        self.treeview.deselect()
+        self.treeview.refresh()
 
         # film deleted -> selection cleared, so delete and update buttons need to be disabled again
         self.delete_film_button.state(["disabled"])
@@ -237,19 +218,18 @@ class FilmWindow(ttk.Frame):
             "film": film
         })
 
-        # Update item in tree with new values
-        iid = str(film.id)
+        # Reload the rows in the tree, the film may have moved if its title changed
+        self.treeview.refresh()
 
-        self.treeview.set(iid, 0, film.title)
-        self.treeview.set(iid, 1, film.year_published)
-        self.treeview.set(iid, 2, film.age_rating.value)
-        self.treeview.set(iid, 3, film.string_conv("duration"))
-        self.treeview.set(iid, 4, film.string_conv("rating"))
+        # Update inspect section data
+        self.inspected_film_id = None
+        self.treeview_select(None)
 
-        # Sort tree incase title changed
-        self.treeview_sort()
+    def refresh(self):
+        """Called when switching back to this window, as it is kept rather than recreated."""
+        self.treeview.refresh()
 
-        # Update inspect section data
+        # Films may have been edited from another window since it was last shown
         self.inspected_film_id = None
         self.treeview_select(None)
 
@@ -326,11 +306,12 @@ class FilmEditDialog(ttk.Frame):
         self.genres_entry = Listbox(self, listvariable=self.genre_choices, height=5, selectmode="extended")
 
         self.poster_frame = ttk.Frame(self)
-        film_poster = "assets/placeholder.png"
+        film_poster = PLACEHOLDER_POSTER
         if self.edit_type == EDIT:
             film_poster = self.film.poster if self.film.poster else film_poster
 
-        self.poster_image = ImageTk.PhotoImage(Image.open(film_poster).resize((200, 200)))
+        self.image_loader = parent.master.image_loader
+        self.poster_image = self.image_loader.load(film_poster, POSTER_SIZE, owner=self)
         self.poster_image_label = ttk.Label(self.poster_frame, image=self.poster_image)
         self.inner_poster_frame = ttk.Frame(self.poster_frame)
         self.poster_path_label = ttk.Label(self.inner_poster_frame, text=film_poster)
@@ -445,7 +426,7 @@ class FilmEditDialog(ttk.Frame):
         for sel_id in self.genres_entry.curselection():
             genres.append(self.all_genres[sel_id])
 
-        poster = None if self.poster_path_label["text"] == "assets/placeholder.png" else self.poster_path_label["text"]
+        poster = None if self.poster_path_label["text"] == PLACEHOLDER_POSTER else self.poster_path_label["text"]
 
         if self.edit_type == ADD:
             self.result = self.add_film(age_rating, genres, poster)
@@ -495,6 +476,7 @@ class FilmEditDialog(ttk.Frame):
 
         _, _file_name = os.path.split(copied_file)
 
-        self.poster_image = ImageTk.PhotoImage(Image.open(copied_file).resize((200, 200)))
+        # Resizes the poster in the background, saving the thumbnail for whenever it is next displayed
+        self.poster_image = self.image_loader.load(copied_file, POSTER_SIZE, owner=self)
         self.poster_image_label.configure(image=self.poster_image)
         self.poster_path_label.config(text=f"assets/{_file_name}")
\ No newline at end of file
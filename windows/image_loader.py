@@ -0,0 +1,139 @@
+from collections import namedtuple
+
+from PIL import Image, ImageTk
+
+from misc.constants import PLACEHOLDER_POSTER
+from misc.thumbnails import load_thumbnail, poster_thumbnails
+from windows.background import BackgroundTasks
+
+PendingImage = namedtuple("PendingImage", ["future", "photo_image", "owners"])
+
+
+def decode_image(path, size, resize):
+    """Opens the image at path, resized to size using its thumbnail if resize is True.
+
+    Runs on the loader's worker threads, so must not touch Tk."""
+    if resize:
+        return load_thumbnail(path, size)
+
+    with Image.open(path) as image:
+        image.load()
+        return image
+
+
+class ImageLoader:
+    """Decodes and resizes images in the background, so slow disks and large
+    images don't freeze the UI.
+
+    load returns a PhotoImage straight away showing a placeholder, and the real
+    image is pasted into that same PhotoImage once it has been decoded, so any
+    widget displaying it updates by itself.
+
+    If every owner widget waiting on an image is destroyed before it is ready,
+    the work is cancelled, or its result thrown away if it had already started."""
+    def __init__(self, root, max_workers=2, cache=poster_thumbnails):
+        self.cache = cache
+        self.tasks = BackgroundTasks(root, max_workers=max_workers, thread_name_prefix="image-loader")
+
+        self.pending = {}  # cache key: PendingImage
+        self.owners = {}  # owner widget name: set of cache keys it is waiting on
+        self.placeholders = {}  # (placeholder path, size): PIL image
+
+    def load(self, path, size=None, owner=None, placeholder=PLACEHOLDER_POSTER):
+        """Gets a PhotoImage of the image at path, resized to size.
+
+        If size is None the image is shown at its original size. If placeholder is
+        None the PhotoImage is left blank until the image is ready. Images that have
+        been loaded recently are returned from the cache, filled in if they are ready."""
+        resize = size is not None
+        if not resize:
+            with Image.open(path) as image:  # Only reads the file's header
+                size = image.size
+
+        key = self.cache.key(path, size)
+        if (cached := self.cache.lookup(key)) is not None:
+            if key in self.pending:
+                self.add_owner(key, owner)
+            return cached
+
+        if key in self.pending:
+            # Dropped from the cache while it was still being decoded, so put it back rather than decoding it twice
+            photo_image = self.pending[key].photo_image
+            self.cache.put(key, photo_image)
+            self.add_owner(key, owner)
+            return photo_image
+
+        photo_image = ImageTk.PhotoImage("RGBA", size)
+        if placeholder:
+            photo_image.paste(self.get_placeholder(placeholder, size))
+        self.cache.put(key, photo_image)  # Later loads of the same image share this one
+
+        future = self.tasks.submit(
+            decode_image, path, size, resize,
+            on_done=lambda image: self.loaded(key, image),
+            on_error=lambda error: self.failed(key))
+        self.pending[key] = PendingImage(future, photo_image, set())
+        self.add_owner(key, owner)
+
+        return photo_image
+
+    def add_owner(self, key, owner):
+        if owner is None:
+            # Nothing to wait on, so the work is never cancelled
+            self.pending[key].owners.add(None)
+            return
+
+        owner_name = str(owner)
+        if owner_name not in self.owners:
+            self.owners[owner_name] = set()
+            owner.bind("<Destroy>", self.owner_destroyed, add="+")
+
+        self.owners[owner_name].add(key)
+        self.pending[key].owners.add(owner_name)
+
+    def get_placeholder(self, path, size):
+        if (path, size) not in self.placeholders:
+            self.placeholders[(path, size)] = load_thumbnail(path, size)
+
+        return self.placeholders[(path, size)]
+
+    def finish(self, key):
+        """Stops tracking the image cached under key, returning its PendingImage."""
+        pending = self.pending.pop(key)
+
+        for owner_name in pending.owners:
+            if owner_name is not None:
+                self.owners.get(owner_name, set()).discard(key)
+
+        return pending
+
+    def loaded(self, key, image):
+        self.finish(key).photo_image.paste(image)
+
+    def failed(self, key):
+        # Don't cache the placeholder as if it was the image, so it is tried again next time
+        pending = self.finish(key)
+        self.cache.discard(key, pending.photo_image)
+
+    def owner_destroyed(self, event):
+        self.cancel_owner(event.widget)
+        self.owners.pop(str(event.widget), None)
+
+    def cancel_owner(self, owner):
+        """Cancels the pending work that only owner was waiting on, eg: when it is destroyed or hidden."""
+        owner_name = str(owner)
+        if owner_name not in self.owners:
+            return  # Never owned anything, eg: the destroy event of an owner's child
+
+        keys, self.owners[owner_name] = self.owners[owner_name], set()
+        for key in keys:
+            self.pending[key].owners.discard(owner_name)
+            if self.pending[key].owners:
+                continue  # Another widget is still waiting on it
+
+            pending = self.finish(key)
+            self.tasks.cancel(pending.future)
+            self.cache.discard(key, pending.photo_image)
+
+    def shutdown(self):
+        self.tasks.shutdown()
@@ -1,5 +1,4 @@
 from tkinter import ttk, messagebox
-from PIL import ImageTk, Image
 
 from windows import NewBooking
 from database_models import session, User
@@ -9,7 +8,7 @@ class LoginWindow(ttk.Frame):
     def __init__(self, parent, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
 
-        self.banner_image = ImageTk.PhotoImage(Image.open("assets/banner.jpg").resize((666, 161)))
+        self.banner_image = parent.image_loader.load("assets/banner.jpg", (666, 161), owner=self)
         self.img_label = ttk.Label(self, image=self.banner_image)
         self.img_label.grid(column=0, row=0, columnspan=2, sticky="ew")
 
@@ -1,12 +1,11 @@
 from tkinter import ttk
-from PIL import ImageTk, Image
 
 
 class MainWindow(ttk.Frame):
     def __init__(self, parent, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
 
-        self.banner_image = ImageTk.PhotoImage(Image.open("assets/banner.jpg"))
+        self.banner_image = parent.image_loader.load("assets/banner.jpg", owner=self)
         self.img_label = ttk.Label(self, image=self.banner_image)
         self.img_label.grid(column=0, row=0, columnspan=2, sticky="ew")
 
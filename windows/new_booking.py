@@ -1,45 +1,34 @@
 from enum import Enum
+from functools import partial
 from tkinter import ttk
 import tkinter as tk
-from PIL import ImageTk, Image
 from sqlalchemy import Column, Float, Integer, Interval, String, Text
 
 from sqlalchemy.sql import and_
 from datetime import datetime, time
-from misc.constants import ADD, EDIT, FILM_FORMAT, MIDNIGHT, EIGHT_AM
-from paginate import Page
+from misc.constants import ADD, EDIT, FILM_FORMAT, MIDNIGHT, EIGHT_AM, PLACEHOLDER_POSTER, POSTER_SIZE
 from tkinter import messagebox
 
-from database_models import session, Showing, Cinema, Film, Screen, Genre, AgeRatings, Booking
+from database_models import session, Showing, Cinema, Film, Screen, Genre, AgeRatings, Booking, PricingContext
+from services import book_seats, list_films_showing, ShowingIndex
 from windows import FilmShowingWindow, FilmWindow
 
 
 class enterDetails(ttk.Frame):
+    QUOTE_DELAY = 30  # ms to wait for the seats to stop changing before updating the price
+
     def __init__(self, parent, *args, **kwargs):
         self.dismiss = kwargs.pop("dismiss")
         self.film = kwargs.pop("film")
         self.time_period = kwargs.pop("time_period")
+        # From the booking window's ShowingIndex, with their film and prices already loaded
+        self.showings = kwargs.pop("showings")
 
         kwargs["padding"] = (3, 3, 3, 3)
         super().__init__(parent, *args, **kwargs)
 
-        now = datetime.now()
-
-        if self.time_period == "morning":
-            time_beginning = datetime.combine(now, time(hour=8, minute=0))
-            time_end = datetime.combine(now, time(hour=11, minute=59))
-        elif self.time_period == "afternoon":
-            time_beginning = datetime.combine(now, time(hour=12, minute=0))
-            time_end = datetime.combine(now, time(hour=16, minute=59))
-        elif self.time_period == "evening":
-            time_beginning = datetime.combine(now, time(hour=17, minute=0))
-            time_end = datetime.combine(now, time(hour=23, minute=59))
-
-        self.showings = session.query(Showing).filter(
-            Showing.film_id == self.film.id,
-            Showing.show_time >= time_beginning,
-            Showing.show_time <= time_end
-        ).all()
+        self.pricing = None  # PricingContext of the selected showing
+        self.quote_after_id = None
 
         if not self.showings:
             messagebox.showerror(title="No Showings", message=f"There are no {self.time_period} showings of {self.film.title}")
@@ -57,7 +46,7 @@ class enterDetails(ttk.Frame):
         self.showing_entry = ttk.Combobox(self.details_frame)
         self.showing_entry["values"] = self.showings_formatted
 
-        self.showing_entry.bind("<<ComboboxSelected>>", self.update_total_price)
+        self.showing_entry.bind("<<ComboboxSelected>>", self.showing_selected)
 
         self.full_name_label = ttk.Label(self.details_frame, text="Full Name:")
         self.full_name_field = ttk.Entry(self.details_frame)
@@ -78,9 +67,9 @@ class enterDetails(ttk.Frame):
         self.seating_option_vip = ttk.Label(self.seating_frame, text="VIP")
         self.seating_no_value_vip = ttk.Spinbox(self.seating_frame, from_=0.0, to=10.0)
 
-        self.seating_no_value_lh.bind("<ButtonRelease-1>", self.spinbox_change)
-        self.seating_no_value_ug.bind("<ButtonRelease-1>", self.spinbox_change)
-        self.seating_no_value_vip.bind("<ButtonRelease-1>", self.spinbox_change)
+        for spinbox in (self.seating_no_value_lh, self.seating_no_value_ug, self.seating_no_value_vip):
+            spinbox.bind("<ButtonRelease-1>", self.spinbox_change)
+            spinbox.bind("<KeyRelease>", self.spinbox_change)
 
         self.price_frame = ttk.LabelFrame(self, text="Total Booking Cost", borderwidth=5, relief="ridge")
         self.total_price_label = ttk.Label(self.price_frame, text="£0.00")
@@ -130,27 +119,37 @@ class enterDetails(ttk.Frame):
     def spinbox_change(self, event):
         """Spinboxes have a small delay between events that signal
         they have changed, and their value updating. To counter this
-        calls to update_total_price from them are delayed slightly too."""
-        # 1ms
-        self.after(1, self.update_total_price, None)
+        calls to update_total_price from them are delayed slightly too.
 
-    def get_total_price(self):
-        showing_index = self.showing_entry.current()
-        if showing_index == -1:
-            return 0.0
+        Holding an arrow key or clicking quickly sends many events, so the
+        price is only updated once they have stopped for QUOTE_DELAY."""
+        if self.quote_after_id is not None:
+            self.after_cancel(self.quote_after_id)
+        self.quote_after_id = self.after(self.QUOTE_DELAY, self.update_total_price, None)
 
+    def showing_selected(self, event):
+        showing_index = self.showing_entry.current()
         try:
-            showing = self.showings[showing_index]
+            showing = self.showings[showing_index] if showing_index != -1 else None
         except IndexError:
+            showing = None
+
+        # Showings come from the ShowingIndex with their city loaded, so this doesn't query
+        self.pricing = PricingContext.for_showing(showing) if showing else None
+        self.update_total_price(event)
+
+    def get_total_price(self):
+        if self.pricing is None:
             return 0.0
 
         l_booked = self.spinbox_int(self.seating_no_value_lh)
         u_booked = self.spinbox_int(self.seating_no_value_ug)
         vip_booked = self.spinbox_int(self.seating_no_value_vip)
 
-        return Booking.calculate_booking_price(showing, l_booked, u_booked, vip_booked)
+        return self.pricing.price(l_booked, u_booked, vip_booked)
 
     def update_total_price(self, event):
+        self.quote_after_id = None
         self.total_price_label["text"] = f"£{self.get_total_price():.2f}"
 
     def confirm(self):
@@ -185,17 +184,19 @@ class enterDetails(ttk.Frame):
             messagebox.showerror(title="Invalid Booking details", message=e)
             return
 
-        booking = Booking(
-            showing=showing,
-            employee=self.master.master.current_user,
-            lower_booked=l_booked,
-            upper_booked=u_booked,
-            vip_booked=vip_booked,
-            name=name,
-            phone=phone_no,
-            email=email)
-        session.add(booking)
-        session.commit()
+        try:
+            booking = book_seats(
+                showing_id=showing.id,
+                employee_id=self.master.master.current_user.id,
+                lower_booked=l_booked,
+                upper_booked=u_booked,
+                vip_booked=vip_booked,
+                name=name,
+                phone=phone_no,
+                email=email)
+        except ValueError as e:
+            messagebox.showerror(title="Booking Failed", message=e)
+            return
 
         messagebox.showinfo(
             title="Booking Created",
@@ -219,16 +220,16 @@ class filmImg(ttk.Frame):
         self.rating_frame = ttk.Frame(self.wrapper_frame, borderwidth=5)
         self.booking_frame = ttk.Frame(self.wrapper_frame)
 
-        self.title = ttk.Label(self.title_frame,text = self.film.title)
-        self.year = ttk.Label(self.title_frame,text = self.film.year_published)
-        self.duration = ttk.Label(self.title_frame,text = self.film.string_conv("duration"))
+        self.title = ttk.Label(self.title_frame)
+        self.year = ttk.Label(self.title_frame)
+        self.duration = ttk.Label(self.title_frame)
 
-        self.synopsis = ttk.Label(self.inspect_frame, text = self.film.synopsis, wraplength=800)
-        self.cast = ttk.Label(self.inspect_frame,text = self.film.cast)
+        self.synopsis = ttk.Label(self.inspect_frame, wraplength=800)
+        self.cast = ttk.Label(self.inspect_frame)
 
-        self.rating = ttk.Label(self.rating_frame,text = self.film.string_conv("rating"))
-        self.age_rating = ttk.Label(self.rating_frame,text = self.film.age_rating.value)
-        self.genres = ttk.Label(self.rating_frame,text = self.film.string_conv("genres"))
+        self.rating = ttk.Label(self.rating_frame)
+        self.age_rating = ttk.Label(self.rating_frame)
+        self.genres = ttk.Label(self.rating_frame)
         # --- BOOK BUTTON ---
         self.book_button = ttk.Button(self.booking_frame, text="Book Now", command=self.book)
 
@@ -240,10 +241,10 @@ class filmImg(ttk.Frame):
         self.evening_film = ttk.Radiobutton(self.booking_frame, text="Evening", value="evening", variable= self.time_period)
 
         #Poster for Film next to information on that film
-        film_img = self.film.poster if self.film.poster else "assets/placeholder.png"
         self.poster_frame = ttk.Frame(self, borderwidth=5, relief="ridge", width=200, height=200)
-        self.film_Image = ImageTk.PhotoImage(Image.open(film_img).resize((200, 200)))
-        self.img_label = ttk.Label(self.poster_frame, image=self.film_Image)
+        self.img_label = ttk.Label(self.poster_frame)
+
+        self.show_film(self.film)
 
         # --- Gridding ---
         self.wrapper_frame.grid(column=0, row=0, sticky="nsew")
@@ -279,16 +280,51 @@ class filmImg(ttk.Frame):
         self.columnconfigure(0, weight=1)
         self.columnconfigure(1, weight=0)
 
+    def show_film(self, film):
+        """Fills the tile in with the details of film.
+
+        Tiles are reused when the page changes, rather than being destroyed and recreated."""
+        self.film = film
+
+        self.title["text"] = film.title
+        self.year["text"] = film.year_published
+        self.duration["text"] = film.string_conv("duration")
+
+        self.synopsis["text"] = film.synopsis
+        self.cast["text"] = film.cast
+
+        self.rating["text"] = film.string_conv("rating")
+        self.age_rating["text"] = film.age_rating.value
+        self.genres["text"] = film.string_conv("genres")
+
+        self.time_period.set("")  # Clear the time chosen for the previous film
+
+        film_img = film.poster if film.poster else PLACEHOLDER_POSTER
+        self.film_Image = self.master.master.image_loader.load(film_img, POSTER_SIZE, owner=self)
+        self.img_label["image"] = self.film_Image
+
     def book(self):
         # get showing time period
         self.time_period_value = self.time_period.get()
+        self.master.showing_index.refresh(self.master.date)  # Only reloads showings that have changed
         self.master.master.show_modal(enterDetails, {
             "film": self.film,
-            "time_period": self.time_period_value
+            "time_period": self.time_period_value,
+            "showings": self.master.showing_index.get(self.film.id, self.time_period_value)
         })
 
 
 class NewBooking(ttk.Frame):
+    """Lets clerks browse the films showing today at their cinema, a page at a time.
+
+    While a page is being looked at, the pages either side of it (PREFETCH_PAGES
+    of them) are fetched in the background along with their posters, so flipping
+    to them doesn't wait on the database or on decoding images. Prefetching is
+    cancelled when the window is switched away from.
+
+    Film tiles are reused between pages, only the details they show change."""
+    PREFETCH_PAGES = 1
+
     def __init__(self, parent, *args, **kwargs):
         kwargs["padding"] = (3, 3, 3, 3)
         super().__init__(parent, *args, **kwargs)
@@ -296,6 +332,8 @@ class NewBooking(ttk.Frame):
         self.cinema_location = ttk.Label(self, text=f"You are booking at: {self.master.current_user.cinema.name}")
         self.cinema_location.grid(column=0, row=0, sticky="ne")
 
+        self.no_films_label = ttk.Label(self, text="There are no films showing today at your cinema.")
+
         self.button_frame = ttk.Frame(self)
         self.prev_button = ttk.Button(self.button_frame, text="Previous Page", command=self.prev_page)
         self.next_button = ttk.Button(self.button_frame, text="Next Page", command=self.next_page)
@@ -303,42 +341,52 @@ class NewBooking(ttk.Frame):
         self.prev_button.grid(column=0, row=0)
         self.next_button.grid(column=1, row=0)
 
-        today = datetime.now()
-        day_beginning = datetime.combine(today, time(hour=0, minute=0))
-        day_end = datetime.combine(today, time(hour=23, minute=59))
-
-        self.todays_films = session.query(Film).join(Film.showings).join(Showing.screen).filter(
-            Screen.cinema_id == parent.current_user.cinema_id,
-            Showing.show_time >= day_beginning,
-            Showing.show_time <= day_end
-        ).all()
+        self.cinema_id = parent.current_user.cinema_id
+        self.showing_index = ShowingIndex(self.cinema_id)  # Today's showings, for the booking dialog
+        self.prefetched_pages = {}  # page number: FilmPage
+        self.prefetching = {}  # page number: future fetching it
+        self.film_tiles = []
 
-        if len(self.todays_films) == 0:
-            self.no_films_label = ttk.Label(self, text="There are no films showing today at your cinema.")
-            self.no_films_label.grid(column=0, row=1)
+        self.refresh()
 
-            self.next_button.destroy()
-            self.prev_button.destroy()
-            return
+    def refresh(self):
+        """Shows the first page of today's films, eg: when switching back to this window."""
+        self.cancel_prefetch()
+        self.prefetched_pages = {}
 
+        self.date = datetime.now().date()
+        self.showing_index.refresh(self.date)
         self.page = self.get_page()
 
-        self.film_tiles = []
+        if not self.page.total:
+            for tile in self.film_tiles:
+                tile.grid_remove()
+            self.button_frame.grid_remove()
+            self.no_films_label.grid(column=0, row=1)
+            return
+
+        self.no_films_label.grid_remove()
         self.display_films()
 
+    def suspend(self):
+        """Called when switching to another window, as this one is kept to be shown again."""
+        self.cancel_prefetch()
+
     def display_films(self):
-        for tile in self.film_tiles:
+        for i, film in enumerate(self.page.films):
+            if i < len(self.film_tiles):
+                self.film_tiles[i].show_film(film)
+            else:
+                self.film_tiles.append(filmImg(self, film=film))
+            self.film_tiles[i].grid(column=0, row=i+1, sticky="nsew")
+
+        # Spare tiles are kept hidden, for when a later page has more films
+        for tile in self.film_tiles[len(self.page.films):]:
             tile.grid_remove()
-            tile.destroy()
-
-        self.film_tiles = []
 
-        for i, film in enumerate(self.page):
-            film_img = filmImg(self, film=film)
-            film_img.grid(column=0, row=i+1, sticky="nsew")
-            self.film_tiles.append(film_img)
+        self.button_frame.grid(column=0, row=len(self.page.films)+1)
 
-        self.button_frame.grid(column=0, row=len(self.page.items)+1)
+        self.prefetch()
 
     def prev_page(self):
         if self.page.page == 1:
@@ -348,12 +396,61 @@ class NewBooking(ttk.Frame):
         self.display_films()
 
     def next_page(self):
-        page = self.get_page(page=self.page.page + 1)
-        if not page.items:
+        if self.page.page >= self.page.page_count:
             return
 
-        self.page = page
+        self.page = self.get_page(page=self.page.page + 1)
         self.display_films()
 
     def get_page(self, page=1):
-        return Page(self.todays_films, page=page, items_per_page=4)
\ No newline at end of file
+        """Gets a page of films, from the prefetched pages if it is there."""
+        if page in self.prefetched_pages:
+            return self.prefetched_pages[page]
+
+        return list_films_showing(self.cinema_id, self.date, page=page)
+
+    def prefetch(self):
+        """Starts fetching the pages around the current one, and forgets any further away."""
+        current = self.page.page
+        wanted = {
+            page for page in range(current - self.PREFETCH_PAGES, current + self.PREFETCH_PAGES + 1)
+            if page != current and 1 <= page <= self.page.page_count}
+
+        # Keep the current page too, flipping back to it after one flip shouldn't fetch it again
+        self.prefetched_pages[current] = self.page
+        for page in list(self.prefetched_pages):
+            if page not in wanted and page != current:
+                del self.prefetched_pages[page]
+
+        for page, future in list(self.prefetching.items()):
+            if page not in wanted:
+                self.master.background_tasks.cancel(future)
+                del self.prefetching[page]
+
+        for page in sorted(wanted):
+            if page in self.prefetched_pages or page in self.prefetching:
+                continue
+
+            self.prefetching[page] = self.master.background_tasks.submit(
+                list_films_showing, self.cinema_id, self.date, page,
+                owner=self, on_done=partial(self.page_prefetched, page),
+                on_error=partial(self.prefetch_failed, page))
+
+    def page_prefetched(self, page_number, page):
+        del self.prefetching[page_number]
+        self.prefetched_pages[page_number] = page
+
+        # Decode the posters now too, they stay in the thumbnail cache until the page is shown
+        for film in page.films:
+            self.master.image_loader.load(film.poster or PLACEHOLDER_POSTER, POSTER_SIZE, owner=self)
+
+    def prefetch_failed(self, page_number, error):
+        # The page will be fetched when it is flipped to instead
+        del self.prefetching[page_number]
+
+    def cancel_prefetch(self):
+        for future in self.prefetching.values():
+            self.master.background_tasks.cancel(future)
+        self.prefetching = {}
+
+        self.master.image_loader.cancel_owner(self)
@@ -1,22 +1,15 @@
 from datetime import datetime
-from calendar import monthrange, month_name
+from calendar import month_name
 
-from fpdf import FPDF
 from tkinter import ttk, Listbox, StringVar, messagebox, filedialog
-from sqlalchemy.sql import func, asc, desc, and_
-from prettytable import PrettyTable
+from sqlalchemy.sql import asc
 
-from database_models import session, Film, Showing, Booking, Cinema, Screen, User
-from misc import FILM_FORMAT
+from database_models import session, Showing
+from services import REPORT_TYPES, MONTHLY_REPORTS, run_report, ReportPDF, render_report
 
 
 class ReportWindow(ttk.Frame):
-    REPORT_TYPES = {
-        "BOOKINGS_PER_FILM": "Total number of bookings per film",
-        "MONTHLY_REVENUE": "Total monthly revenue for each cinema",
-        "TOP_REVENUE": "Top revenue generating film",
-        "EMPLOYEE_BOOKINGS": "Monthly total of bookings each employee has made"
-    }
+    REPORT_TYPES = REPORT_TYPES
 
     def __init__(self, parent, *args, **kwargs):
         kwargs["padding"] = (3, 3, 3, 3)
@@ -28,13 +21,29 @@ class ReportWindow(ttk.Frame):
         self.generate_button = ttk.Button(self, text="Generate Report", command=self.generate_report)
         self.generate_button.state(["disabled"])  # Requires selection to work, begins disabled
 
+        # Shown while a report is being generated in the background
+        self.progress_frame = ttk.Frame(self)
+        self.progress_label = ttk.Label(self.progress_frame)
+        self.progress_bar = ttk.Progressbar(self.progress_frame, mode="determinate")
+        self.cancel_button = ttk.Button(self.progress_frame, text="Cancel", command=self.cancel_report)
+
+        self.progress_label.grid(column=0, row=0, columnspan=2, sticky="w")
+        self.progress_bar.grid(column=0, row=1, sticky="ew")
+        self.cancel_button.grid(column=1, row=1)
+        self.progress_frame.columnconfigure(0, weight=1)
+
+        self.report_future = None
+
         self.report_type_listbox.grid(column=0, row=0, sticky="nesw")
         self.generate_button.grid(column=0, row=1, sticky="sew")
+        self.progress_frame.grid(column=0, row=2, sticky="ew")
+        self.progress_frame.grid_remove()
 
         self.columnconfigure(0, weight=1)
 
         self.rowconfigure(0, weight=1)
         self.rowconfigure(1, weight=0)
+        self.rowconfigure(2, weight=0)
 
     def report_select(self, event):
         """Enables the generate button when a selection is first made."""
@@ -46,29 +55,42 @@ class ReportWindow(ttk.Frame):
         self.generate_button.state(["!disabled"])
 
     @staticmethod
-    def get_month_start_end(month, year):
-        month_start = datetime(year=year, month=month, day=1)
-        _, month_length = monthrange(year, month)
-        month_end = datetime(year=year, month=month, day=month_length, hour=23, minute=59, second=59)
-
-        return month_start, month_end
-
-    def save_to_pdf(self, title, table, default_filename):
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("helvetica", "", 18)
-        pdf.write(txt=title)
-        pdf.ln(h=10)
-        pdf.set_font("courier", "", 10)
-        pdf.write(txt=table)
-
+    def save_to_pdf(pdf, default_filename):
+        """Asks where to save a rendered pdf, given as bytes, then saves it there."""
         filename = filedialog.asksaveasfilename(initialfile=default_filename, defaultextension="pdf")
         if not filename:
             return
 
-        pdf.output(filename)
+        with open(filename, "wb") as file:
+            file.write(pdf)
+
+    @staticmethod
+    def build_report(report_type, month, year, progress):
+        """Runs a report and renders it as a pdf, returning the report and the bytes of the pdf
+        (None if there is nothing to report on).
+
+        Runs on a worker thread, so must not touch any widgets."""
+        progress(0, None, "Running report")
+        report = run_report(report_type, month=month, year=year)
+
+        row_count = len(report.rows)
+        if report_type == "TOP_REVENUE" and row_count <= 1:
+            if not report.rows:
+                return report, None
+
+            film_string, total_revenue = report.rows[0]
+            pdf = ReportPDF(report.title)
+            pdf.write_text(f"{film_string} has generated a total of £{total_revenue:.2f}")
+        else:
+            pdf = render_report(report, progress=progress)
+
+        progress(row_count, row_count, "Saving PDF")
+        return report, bytes(pdf.output())
 
     def generate_report(self):
+        if self.report_future is not None:
+            return  # Already generating one
+
         try:
             selected = int(self.report_type_listbox.curselection()[0])
         except IndexError:
@@ -76,123 +98,71 @@ class ReportWindow(ttk.Frame):
             self.generate_button.state(["disabled"])
             return
 
-        selected = list(ReportWindow.REPORT_TYPES.values())[selected]
-
-        if selected == ReportWindow.REPORT_TYPES["BOOKINGS_PER_FILM"]:
-            """The equivalent sql for this sqlalchemy query:
-
-            SELECT
-                *,
-                SUM(booking.lower_booked) AS `lb`,
-                SUM(booking.upper_booked) AS `ub`,
-                SUM(booking.vip_booked) AS `vb`,
-                (`lb` + `ub` + `vb`) AS `total_b`
-            FROM film
-            INNER JOIN showing ON film.id = showing.film_id
-            INNER JOIN booking ON showing.id = booking.showing_id
-            GROUP BY film.id
-            ORDER BY DESC `total_b`"""
-            lower = func.sum(Booking.lower_booked)
-            upper = func.sum(Booking.upper_booked)
-            vip = func.sum(Booking.vip_booked)
-
-            query = session.query(Film, lower, upper, vip, (lower + upper + vip).label("total_b"))
-            query = query.join(Film.showings).join(Showing.bookings).group_by(Film.id)
-            query = query.order_by(desc("total_b"))
-
-            table = PrettyTable()
-            table.field_names = ["Film", "Lower Hall", "Upper Gallery", "VIP", "Total"]
-            for film, *booking_values in query.all():
-                table.add_row([FILM_FORMAT.format(film), *booking_values])
-
-            self.save_to_pdf(title=selected, table=table.get_string(), default_filename="bookings per film")
-        elif selected == ReportWindow.REPORT_TYPES["MONTHLY_REVENUE"]:
+        report_type = list(ReportWindow.REPORT_TYPES.keys())[selected]
+
+        month = year = None
+        if report_type in MONTHLY_REPORTS:
             try:
                 month, year = self.master.show_modal(ReportDateDialog)
             except TypeError:
                 # User closed datepicker without selecting, cancel report generation
                 return
-            month_start, month_end = self.get_month_start_end(month, year)
-
-            cinemas = session.query(Cinema).all()
-
-            for cinema in cinemas:
-                query = session.query(Showing).join(Showing.screen)
-                query = query.filter(Screen.cinema == cinema).filter(and_(
-                    Showing.show_time >= month_start,
-                    Showing.show_time <= month_end))
 
-                cinema.total_revenue = 0.0
+        # Big reports take a while to write, so they are built in the background and
+        # only saved once they are ready, leaving the rest of the application usable
+        self.report_future = self.master.background_tasks.submit(
+            self.build_report, report_type, month, year,
+            owner=self, on_done=self.report_ready, on_error=self.report_failed, on_progress=self.report_progress)
+
+        self.report_type_listbox.configure(state="disabled")
+        self.generate_button.state(["disabled"])
+        self.report_progress(0, None, "Starting report")
+        self.progress_frame.grid()
+
+    def report_progress(self, done, total, stage):
+        if total is None:
+            self.progress_label.configure(text=f"{stage}...")
+            if str(self.progress_bar["mode"]) != "indeterminate":
+                self.progress_bar.configure(mode="indeterminate")
+                self.progress_bar.start()
+            return
 
-                for showing in query.all():
-                    cinema.total_revenue += sum([booking.calculate_price() for booking in showing.bookings])
+        self.progress_label.configure(text=f"{stage} ({done}/{total})...")
+        if str(self.progress_bar["mode"]) != "determinate":
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode="determinate")
+        self.progress_bar.configure(maximum=max(total, 1), value=done)
 
-                cinema.total_revenue = round(cinema.total_revenue, 2)
+    def report_finished(self):
+        """Hides the progress of the report and lets another one be generated."""
+        self.report_future = None
 
-            cinemas = sorted(cinemas, key=lambda c: c.total_revenue, reverse=True)
+        self.progress_bar.stop()
+        self.progress_frame.grid_remove()
 
-            table = PrettyTable(custom_format={"Total Revenue": lambda f, v: f'£{v:.2f}'})
-            table.field_names = ["Cinema", "Total Revenue"]
-            table.add_rows([cinema.name, cinema.total_revenue] for cinema in cinemas)
+        self.report_type_listbox.configure(state="normal")
+        if self.report_type_listbox.curselection():
+            self.generate_button.state(["!disabled"])
 
-            self.save_to_pdf(
-                title=f"Total revenue for {month_start.strftime('%B %Y')}",
-                table=table.get_string(),
-                default_filename=f"cinema revenue {month_start.strftime('%B %Y')}")
-        elif selected == ReportWindow.REPORT_TYPES["TOP_REVENUE"]:
-            films = session.query(Film).all()
+    def report_ready(self, result):
+        self.report_finished()
 
-            for film in films:
-                film.total_revenue = 0.0
+        report, pdf = result
+        if pdf is None:
+            messagebox.showerror(title="Error", message="There are no films to report on")
+            return
 
-                for showing in film.showings:
-                    film.total_revenue += sum([booking.calculate_price() for booking in showing.bookings])
+        self.save_to_pdf(pdf, report.default_filename)
 
-                film.total_revenue = round(film.total_revenue, 2)
+    def report_failed(self, error):
+        self.report_finished()
+        messagebox.showerror(title="Error", message=f"The report could not be generated: {error}")
 
-            films = sorted(films, key=lambda f: f.total_revenue, reverse=True)
+    def cancel_report(self):
+        if self.report_future is not None:
+            self.master.background_tasks.cancel(self.report_future)
 
-            film_string = FILM_FORMAT.format(films[0])
-            self.save_to_pdf(
-                title=selected,
-                table=f"{film_string} has generated a total of £{films[0].total_revenue:.2f}",
-                default_filename="top revenue film")
-        elif selected == ReportWindow.REPORT_TYPES["EMPLOYEE_BOOKINGS"]:
-            try:
-                month, year = self.master.show_modal(ReportDateDialog)
-            except TypeError:
-                # User closed datepicker without selecting, cancel report generation
-                return
-            month_start, month_end = self.get_month_start_end(month, year)
-
-            """Equivalent sql for this query is:
-
-            SELECT
-                *,
-                COUNT(booking.id) AS `booking_count`
-            FROM user
-            INNER JOIN booking ON user.id = booking.employee_id
-            INNER JOIN showing ON booking.showing_id = showing.id
-            WHERE
-                showing.show_time >= {month_start} AND
-                showing.show_time <= {month_end}
-            GROUP BY user.id
-            ORDER BY DESC `booking_count`"""
-            query = session.query(User, func.count(Booking.id).label("booking_count"))
-            query = query.join(User.bookings).join(Booking.showing)
-            query = query.filter(and_(
-                    Showing.show_time >= month_start,
-                    Showing.show_time <= month_end))
-            query = query.group_by(User.id).order_by(desc("booking_count"))
-
-            table = PrettyTable()
-            table.field_names = ["Employee", "Total Bookings"]
-            table.add_rows([user.username, total_bookings] for user, total_bookings in query.all())
-
-            self.save_to_pdf(
-                title=f"Total bookings per employee for {month_start.strftime('%B %Y')}",
-                table=table.get_string(),
-                default_filename=f"employee bookings {month_start.strftime('%B %Y')}")
+        self.report_finished()
 
 
 class ReportDateDialog(ttk.Frame):
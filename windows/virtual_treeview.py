@@ -0,0 +1,202 @@
+from collections import deque
+from tkinter import ttk
+
+from services.paging import PAGE_SIZE
+
+
+class VirtualTreeview(ttk.Frame):
+    """A treeview (with scrollbar) that only holds a window of rows from a
+    much larger sorted result set.
+
+    Rows are fetched a page at a time by calling fetch_page(after=None,
+    before=None, limit=page_size), which needs to return the rows on either
+    side of a sort key in ascending order, as (key, iid, values) tuples. When
+    the view is scrolled to the bottom the next page is fetched and appended,
+    and when it is scrolled to the top the previous page is fetched and
+    prepended. At most max_pages pages are kept in the tree, the page
+    furthest from the view is dropped when another is added.
+
+    The selected row is remembered by iid even when its page is dropped,
+    and reselected if it is fetched again. Use the tree attribute to bind
+    to events on the inner ttk.Treeview."""
+    SCROLL_THRESHOLD = 0.05  # How close to either end of the tree a scroll must be to fetch another page
+
+    def __init__(self, parent, headings, fetch_page=None, page_size=PAGE_SIZE, max_pages=3, *args, **kwargs):
+        super().__init__(parent, *args, **kwargs)
+
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.max_pages = max_pages
+
+        self.pages = deque()  # Each page is a list of (key, iid) tuples, in the order they are in the tree
+        self.at_start = True
+        self.at_end = True
+        self.loading = False
+        self.selected_iid = None
+
+        self.tree = ttk.Treeview(self,
+            columns=tuple(i for i in range(len(headings))),
+            show="headings",
+            selectmode="browse")  # Only allow one row to be selected at once
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
+        self.tree["yscrollcommand"] = self.yscroll
+        for i, value in enumerate(headings):
+            self.tree.column(i, stretch=True)
+            self.tree.heading(i, text=value)
+
+        self.tree.bind("<<TreeviewSelect>>", self.tree_select, add="+")
+
+        self.tree.grid(column=0, row=0, sticky="nsew")
+        self.scrollbar.grid(column=1, row=0, sticky="ns")
+
+        self.columnconfigure(0, weight=1)
+        self.columnconfigure(1, weight=0)
+        self.rowconfigure(0, weight=1)
+
+    def selection(self):
+        """The iid of the selected row (if any) as a tuple, like ttk.Treeview.selection.
+
+        Still returns the selected row when it has been scrolled out of the tree."""
+        return (self.selected_iid,) if self.selected_iid is not None else ()
+
+    def deselect(self):
+        """Clears the selection, eg: when the selected row has been deleted."""
+        self.selected_iid = None
+        self.tree.selection_set(())
+
+    def tree_select(self, event):
+        selection = self.tree.selection()
+        if selection:
+            self.selected_iid = selection[0]
+
+    def reset(self, fetch_page=None):
+        """Clears the tree and loads the first page, eg: after the filters have changed.
+
+        The selection is cleared too."""
+        if fetch_page:
+            self.fetch_page = fetch_page
+
+        self.selected_iid = None
+        self.load_from(None)
+
+    def refresh(self):
+        """Reloads the rows in the tree, keeping the scroll position and selection where possible,
+        eg: after a row has been added, updated or deleted."""
+        first_visible = self.tree.yview()[0]
+
+        after = None
+        if not self.at_start and self.pages and self.pages[0]:
+            # Pages are fetched after a key, so find the key of the row before the tree starts
+            previous = self.fetch_page(before=self.pages[0][0][0], limit=1)
+            after = previous[0][0] if previous else None
+
+        self.load_from(after)
+        self.tree.yview_moveto(first_visible)
+
+    def load_from(self, after):
+        self.tree.delete(*self.tree.get_children())
+        self.pages.clear()
+
+        rows = self.fetch_page(after=after, limit=self.page_size)
+        self.at_start = after is None
+        self.at_end = len(rows) < self.page_size
+        self.pages.append(self.insert_rows(rows, "end"))
+
+        if not rows and not self.at_start:
+            # Everything after the old first page was deleted, start again from the top
+            self.load_from(None)
+
+    def insert_rows(self, rows, index):
+        """Inserts fetched rows into the tree at index, returning them as a page."""
+        page = []
+        for key, iid, values in rows:
+            if self.tree.exists(iid):
+                continue  # Moved since its page was loaded, eg: edited by another terminal
+
+            position = index if index == "end" else index + len(page)
+            self.tree.insert("", position, iid=iid, values=values)
+            page.append((key, str(iid)))
+
+        if self.selected_iid is not None and self.tree.exists(self.selected_iid) and not self.tree.selection():
+            self.tree.selection_set(self.selected_iid)
+
+        return page
+
+    def drop_page(self, page):
+        self.tree.delete(*(iid for _, iid in page))
+
+    def yscroll(self, first, last):
+        """Passes scroll updates on to the scrollbar, fetching a new page
+        if either end of the tree has been reached."""
+        self.scrollbar.set(first, last)
+
+        if self.loading or self.fetch_page is None:
+            return
+
+        if float(last) >= 1 - self.SCROLL_THRESHOLD and not self.at_end:
+            self.loading = True
+            self.after_idle(self.load_next)
+        elif float(first) <= self.SCROLL_THRESHOLD and not self.at_start:
+            self.loading = True
+            self.after_idle(self.load_previous)
+
+    def load_next(self):
+        try:
+            total = len(self.tree.get_children())
+            first_visible = round(self.tree.yview()[0] * total)
+
+            after = self.pages[-1][-1][0]
+            page = []
+            while not page:
+                rows = self.fetch_page(after=after, limit=self.page_size)
+                self.at_end = len(rows) < self.page_size
+                page = self.insert_rows(rows, "end")
+                if self.at_end:
+                    break
+
+                # Every row was already in the tree, so carry on after them rather than fetching them again
+                after = rows[-1][0]
+
+            if not page:
+                return
+            self.pages.append(page)
+
+            if len(self.pages) > self.max_pages:
+                dropped = self.pages.popleft()
+                self.drop_page(dropped)
+                self.at_start = False
+                first_visible -= len(dropped)
+
+            self.tree.yview_moveto(first_visible / len(self.tree.get_children()))
+        finally:
+            self.loading = False
+
+    def load_previous(self):
+        try:
+            total = len(self.tree.get_children())
+            first_visible = round(self.tree.yview()[0] * total)
+
+            before = self.pages[0][0][0]
+            page = []
+            while not page:
+                rows = self.fetch_page(before=before, limit=self.page_size)
+                self.at_start = len(rows) < self.page_size
+                page = self.insert_rows(rows, 0)
+                if self.at_start:
+                    break
+
+                # Every row was already in the tree, so carry on before them rather than fetching them again
+                before = rows[0][0]
+
+            if not page:
+                return
+            self.pages.appendleft(page)
+            first_visible += len(page)
+
+            if len(self.pages) > self.max_pages:
+                self.drop_page(self.pages.pop())
+                self.at_end = False
+
+            self.tree.yview_moveto(first_visible / len(self.tree.get_children()))
+        finally:
+            self.loading = False